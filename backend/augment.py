@@ -0,0 +1,189 @@
+"""
+Croply AI — Batched Tensor Augmentation
+GPU/CPU-vectorized replacement for the per-sample PIL `train_transform` in
+model.py. DataLoader workers only hand over uint8 (N, 3, H, W) batches; all
+randomness is drawn per sample but applied with whole-batch tensor ops:
+
+  • random crop + horizontal/vertical flip + rotation + translate/scale,
+    composed into one affine matrix per sample and applied with a single
+    `grid_sample` call
+  • brightness / contrast / saturation / hue jitter and random grayscale
+  • ImageNet normalization and random erasing
+"""
+
+import math
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from PIL import Image
+from torchvision.transforms import functional as TF
+
+from preprocessing import INPUT_SIZE, MEAN, STD
+
+# Luma weights (ITU-R 601), as used by torchvision's rgb_to_grayscale
+_GRAY = torch.tensor([0.299, 0.587, 0.114])
+
+# RGB <-> YIQ, used to rotate hue without an HSV round trip
+_RGB_TO_YIQ = torch.tensor([
+    [0.299, 0.587, 0.114],
+    [0.596, -0.274, -0.322],
+    [0.211, -0.523, 0.312],
+])
+_YIQ_TO_RGB = torch.linalg.inv(_RGB_TO_YIQ)
+
+
+def _uniform(n, low, high, device):
+    return torch.empty(n, device=device).uniform_(low, high)
+
+
+class BatchAugment(nn.Module):
+    """
+    Batched equivalent of model.py's train_transform. Takes uint8 or [0, 1]
+    float images of shape (N, 3, H, W) and returns normalized float32
+    images of shape (N, 3, crop_size, crop_size).
+    """
+    def __init__(self, crop_size=INPUT_SIZE, hflip_p=0.5, vflip_p=0.3, degrees=30.0,
+                 translate=(0.1, 0.1), scale=(0.9, 1.1), brightness=0.2, contrast=0.2,
+                 saturation=0.2, hue=0.1, grayscale_p=0.05, erasing_p=0.2,
+                 erasing_scale=(0.02, 0.2), erasing_ratio=(0.3, 3.3)):
+        super().__init__()
+        self.crop_size = crop_size
+        self.hflip_p = hflip_p
+        self.vflip_p = vflip_p
+        self.degrees = degrees
+        self.translate = translate
+        self.scale = scale
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.grayscale_p = grayscale_p
+        self.erasing_p = erasing_p
+        self.erasing_scale = erasing_scale
+        self.erasing_ratio = erasing_ratio
+        self.register_buffer("mean", torch.from_numpy(MEAN).view(1, 3, 1, 1), persistent=False)
+        self.register_buffer("std", torch.from_numpy(STD).view(1, 3, 1, 1), persistent=False)
+        self.register_buffer("gray", _GRAY.view(1, 3, 1, 1), persistent=False)
+        self.register_buffer("rgb_to_yiq", _RGB_TO_YIQ, persistent=False)
+        self.register_buffer("yiq_to_rgb", _YIQ_TO_RGB, persistent=False)
+
+    def _affine(self, images):
+        """Crop, flips, rotation, translation and scale as one grid_sample."""
+        n, _, height, width = images.shape
+        device = images.device
+
+        # Output → input mapping in normalized [-1, 1] coordinates:
+        # p_in = crop * flip * R(-θ) * (p_out - t) / s + c
+        angle = _uniform(n, -self.degrees, self.degrees, device) * (math.pi / 180)
+        s = _uniform(n, *self.scale, device)
+        tx = _uniform(n, -self.translate[0], self.translate[0], device) * 2
+        ty = _uniform(n, -self.translate[1], self.translate[1], device) * 2
+        fx = torch.where(torch.rand(n, device=device) < self.hflip_p, -1.0, 1.0)
+        fy = torch.where(torch.rand(n, device=device) < self.vflip_p, -1.0, 1.0)
+
+        kx, ky = self.crop_size / width, self.crop_size / height
+        cx = _uniform(n, -(1 - kx), 1 - kx, device)
+        cy = _uniform(n, -(1 - ky), 1 - ky, device)
+
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        a00, a01 = kx * fx * cos / s, kx * fx * sin / s
+        a10, a11 = -ky * fy * sin / s, ky * fy * cos / s
+        theta = torch.stack([
+            torch.stack([a00, a01, cx - (a00 * tx + a01 * ty)], dim=1),
+            torch.stack([a10, a11, cy - (a10 * tx + a11 * ty)], dim=1),
+        ], dim=1)
+
+        grid = F.affine_grid(theta, (n, 3, self.crop_size, self.crop_size), align_corners=False)
+        return F.grid_sample(images, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+
+    def _color(self, images):
+        """
+        Brightness, contrast, saturation, hue and random grayscale, per sample.
+        Each of these is linear in RGB, so they are folded into one 3×3 matrix
+        plus offset per image and applied in a single batched matmul (clamping
+        once at the end instead of after every step).
+        """
+        n, _, height, width = images.shape
+        device = images.device
+        eye = torch.eye(3, device=device).expand(n, 3, 3)
+        # Every row is the luma weights: G @ rgb == gray broadcast to 3 channels
+        to_gray = self.gray.view(1, 1, 3).expand(n, 3, 3)
+        matrix = eye.clone()
+        offset = torch.zeros(n, 1, 1, device=device)
+
+        if self.brightness:
+            matrix = matrix * _uniform(n, 1 - self.brightness, 1 + self.brightness, device).view(n, 1, 1)
+        if self.contrast:
+            # Blend towards the mean gray level of the brightness-adjusted image
+            factor = _uniform(n, 1 - self.contrast, 1 + self.contrast, device).view(n, 1, 1)
+            gray_mean = (images.mean(dim=(2, 3)) * self.gray.view(1, 3)).sum(dim=1).view(n, 1, 1)
+            offset = (1 - factor) * gray_mean * matrix[:, :1, :1]
+            matrix = matrix * factor
+        if self.saturation:
+            # Blend towards the per-pixel gray image; gray of a constant offset is itself
+            factor = _uniform(n, 1 - self.saturation, 1 + self.saturation, device).view(n, 1, 1)
+            matrix = (factor * eye + (1 - factor) * to_gray) @ matrix
+        if self.hue:
+            # Rotate the chroma (I, Q) plane of YIQ by the hue shift; leaves gray unchanged
+            angle = _uniform(n, -self.hue, self.hue, device) * 2 * math.pi
+            cos, sin = torch.cos(angle), torch.sin(angle)
+            rotation = torch.zeros(n, 3, 3, device=device)
+            rotation[:, 0, 0] = 1
+            rotation[:, 1, 1], rotation[:, 1, 2] = cos, sin
+            rotation[:, 2, 1], rotation[:, 2, 2] = -sin, cos
+            matrix = self.yiq_to_rgb @ rotation @ self.rgb_to_yiq @ matrix
+        if self.grayscale_p:
+            mask = (torch.rand(n, device=device) < self.grayscale_p).view(n, 1, 1)
+            matrix = torch.where(mask, to_gray @ matrix, matrix)
+
+        images = torch.baddbmm(offset, matrix, images.reshape(n, 3, height * width))
+        return images.view(n, 3, height, width).clamp_(0, 1)
+
+    def _erase(self, images):
+        """Random erasing: zero one random rectangle in a random subset of images."""
+        n, _, height, width = images.shape
+        device = images.device
+
+        area = _uniform(n, *self.erasing_scale, device) * height * width
+        log_ratio = _uniform(n, math.log(self.erasing_ratio[0]), math.log(self.erasing_ratio[1]), device)
+        ratio = torch.exp(log_ratio)
+        h = torch.sqrt(area * ratio).clamp(1, height).floor()
+        w = torch.sqrt(area / ratio).clamp(1, width).floor()
+        top = (torch.rand(n, device=device) * (height - h + 1)).floor()
+        left = (torch.rand(n, device=device) * (width - w + 1)).floor()
+        apply = torch.rand(n, device=device) < self.erasing_p
+
+        rows = torch.arange(height, device=device).view(1, height, 1)
+        cols = torch.arange(width, device=device).view(1, 1, width)
+        mask = ((rows >= top.view(-1, 1, 1)) & (rows < (top + h).view(-1, 1, 1))
+                & (cols >= left.view(-1, 1, 1)) & (cols < (left + w).view(-1, 1, 1))
+                & apply.view(-1, 1, 1))
+        return images.masked_fill(mask.unsqueeze(1), 0.0)
+
+    @torch.no_grad()
+    def forward(self, images):
+        if images.dtype == torch.uint8:
+            images = images.float().div_(255)
+        images = self._affine(images)
+        images = self._color(images)
+        images = (images - self.mean) / self.std
+        if self.erasing_p:
+            images = self._erase(images)
+        return images
+
+
+class ToUint8Tensor:
+    """
+    Per-sample transform for the batched pipeline: PIL image or uint8 tensor
+    → (3, size, size) uint8 tensor. Everything random happens in BatchAugment.
+    """
+    def __init__(self, size=256):
+        self.size = size
+
+    def __call__(self, image):
+        if isinstance(image, Image.Image):
+            image = TF.pil_to_tensor(image.convert("RGB"))
+        if tuple(image.shape[-2:]) != (self.size, self.size):
+            image = TF.resize(image, [self.size, self.size], antialias=True)
+        return image
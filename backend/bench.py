@@ -0,0 +1,379 @@
+"""
+Croply AI — End-to-end Load Test
+Drives the FastAPI app in-process at a fixed concurrency while a local stand-in
+for the Groq chat-completions endpoint answers every LLM call, so /predict,
+/chat and /care-tips can be load tested without touching the real API.
+
+The stub has configurable latency, jitter, token streaming rate and error
+rate. `llm.GROQ_API_URL` is pointed at it for the duration of the run.
+
+    python bench.py run --requests 500 --concurrency 32 --output bench.json
+    python bench.py run --endpoints chat care-tips --stub-latency-ms 300 --stub-error-rate 0.05
+    python bench.py compare baseline.json bench.json
+    python bench.py stub --port 9000      # stub only, for GROQ_API_URL=http://127.0.0.1:9000/v1/chat/completions
+
+Results are JSON with one block per endpoint (requests/sec, p50/p95/p99
+latency, error rate), tagged with the git commit they were measured on.
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+
+import cv2
+import numpy as np
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ENDPOINTS = ("predict", "chat", "chat-stream", "care-tips", "care-tips-stream")
+
+# Canned disease info that passes knowledge.validate_disease_info
+_DISEASE_INFO = {
+    "name": "Stub Disease",
+    "description": "Canned answer from the benchmark stub.",
+    "symptoms": ["Spots on leaves"],
+    "causes": ["Fungal infection"],
+    "treatment_options": [{"method": "Fungicide", "description": "Apply weekly", "effectiveness": "High"}],
+    "prevention": ["Rotate crops"],
+}
+
+
+# ── Groq stand-in ───────────────────────────────────────────────────────────
+def create_stub_app(latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, error_status=500,
+                    retry_after=None, tokens=60, token_interval_ms=5.0, seed=0):
+    """
+    OpenAI-compatible chat-completions endpoint with synthetic latency.
+    `error_rate` of the calls fail with `error_status` (e.g. 429, optionally
+    with a Retry-After header); streamed replies emit `tokens` deltas spaced
+    by `token_interval_ms`.
+    """
+    rng = random.Random(seed)
+    stub = FastAPI(title="Groq stub")
+    stub.state.calls = 0
+    stub.state.errors = 0
+
+    def delay():
+        return max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+
+    @stub.post("/v1/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        stub.state.calls += 1
+        await asyncio.sleep(delay())
+
+        if rng.random() < error_rate:
+            stub.state.errors += 1
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            return JSONResponse({"error": {"message": "stub error"}}, status_code=error_status, headers=headers)
+
+        if payload.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps(_DISEASE_INFO)
+        else:
+            content = " ".join(f"token{i}" for i in range(tokens))
+
+        if not payload.get("stream"):
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+
+        async def events():
+            for i, word in enumerate(content.split(" ")):
+                delta = {"content": word if i == 0 else " " + word}
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n"
+                await asyncio.sleep(token_interval_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return stub
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Run the stub app with uvicorn on a background thread."""
+    def __init__(self, app, port=0):
+        self.app = app
+        self.port = port or _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1/chat/completions"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.run, name="groq-stub", daemon=True)
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join(5)
+
+
+# ── Load generator ──────────────────────────────────────────────────────────
+def synthetic_leaf(seed, size=320):
+    """JPEG bytes of a green leaf-shaped blob on a light background, unique per seed."""
+    rng = np.random.default_rng(seed)
+    image = np.full((size, size, 3), 225, np.uint8)
+    axes = (int(size * rng.uniform(0.25, 0.4)), int(size * rng.uniform(0.15, 0.25)))
+    color = tuple(int(c) for c in (rng.integers(20, 60), rng.integers(120, 200), rng.integers(20, 80)))
+    cv2.ellipse(image, (size // 2, size // 2), axes, float(rng.uniform(0, 180)), 0, 360, color, -1)
+    image = cv2.add(image, rng.integers(0, 12, image.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def load_images(image_dir):
+    names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+    images = []
+    for name in names:
+        with open(os.path.join(image_dir, name), "rb") as f:
+            images.append((name, f.read()))
+    return images
+
+
+def _request_factory(endpoint, images, unique_images, language):
+    """Return a callable (client, n) -> awaitable HTTP status for one endpoint."""
+    if endpoint == "predict":
+        async def call(client, n):
+            if unique_images:
+                name, data = f"leaf{n}.jpg", synthetic_leaf(n)
+            else:
+                name, data = images[n % len(images)]
+            response = await client.post("/predict", files={"file": (name, data)}, data={"language": language})
+            return response.status_code
+        return call
+
+    path = "/" + endpoint.replace("-stream", "/stream")
+    if endpoint.startswith("chat"):
+        def body(n):
+            return {"message": f"How do I treat early blight? ({n})", "language": language,
+                    "history": [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]}
+    else:
+        def body(n):
+            return {"plant_name": f"Tomato {n}", "language": language}
+
+    async def call(client, n):
+        if endpoint.endswith("-stream"):
+            # Consume the whole event stream so its full duration is measured
+            status = None
+            async with client.stream("POST", path, json=body(n)) as response:
+                async for line in response.aiter_lines():
+                    # Mid-stream failures arrive as an SSE error event on a 200
+                    if line.startswith("event: error"):
+                        status = "stream_error"
+            return status or response.status_code
+        return (await client.post(path, json=body(n))).status_code
+    return call
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)} if len(values) else {}
+
+
+async def drive(app, endpoints, requests, concurrency, images, unique_images=False, language="English"):
+    """
+    Fire `requests` calls per endpoint at `app`, interleaved, with at most
+    `concurrency` in flight. Returns per-endpoint stats and overall totals.
+    """
+    calls = {e: _request_factory(e, images, unique_images, language) for e in endpoints}
+    work = [(e, n) for n in range(requests) for e in endpoints]
+    latencies, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    queue = asyncio.Queue()
+    for item in work:
+        queue.put_nowait(item)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker():
+            while not queue.empty():
+                endpoint, n = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    status = await calls[endpoint](client, n)
+                except Exception:
+                    status = "exception"
+                latencies[endpoint].append((time.perf_counter() - start) * 1000)
+                statuses[endpoint][status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint in endpoints:
+        count = len(latencies[endpoint])
+        errors = sum(c for s, c in statuses[endpoint].items() if isinstance(s, str) or s >= 400)
+        results[endpoint] = {
+            "requests": count,
+            "requests_per_sec": count / elapsed,
+            "error_rate": errors / count if count else None,
+            "status_counts": {str(s): c for s, c in statuses[endpoint].items()},
+            "latency_ms": percentiles(latencies[endpoint]),
+        }
+    return {"elapsed_sec": elapsed, "requests_per_sec": len(work) / elapsed, "endpoints": results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args):
+    """Start the stub, point llm at it and load test the app in-process."""
+    stub_app = create_stub_app(args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate,
+                               args.stub_error_status, args.stub_retry_after, args.stub_tokens,
+                               args.stub_token_interval_ms)
+    with StubServer(stub_app) as stub:
+        import llm
+        llm.GROQ_API_URL = stub.url
+        llm.GROQ_API_KEY = llm.GROQ_API_KEY or "bench"
+        # Fresh scheduler per run; unset options keep the CROPLY_LLM_* config
+        llm.scheduler = llm.LLMScheduler(**{k: v for k, v in (
+            ("rpm", args.llm_rpm), ("tpm", args.llm_tpm), ("concurrency", args.llm_concurrency),
+            ("queue_depth", args.llm_queue_depth), ("max_retries", args.llm_max_retries),
+        ) if v is not None})
+
+        import main
+        if args.no_knowledge:
+            main.knowledge_base = main.KnowledgeBase(":memory:")
+        images = load_images(args.images) if args.images else [(f"leaf{i}.jpg", synthetic_leaf(i)) for i in range(8)]
+
+        async with main.lifespan(main.app):
+            # The classifier warms up in the background; /predict is only measured once it is ready
+            await main.app.state.warmup
+            if "predict" in args.endpoints and main.model_state["status"] != "ready":
+                raise SystemExit("Model weights could not be loaded; drop 'predict' from --endpoints")
+            # Warm up every endpoint once so lazy setup isn't measured
+            await drive(main.app, args.endpoints, 1, 1, images, args.unique_images, args.language)
+            stub_app.state.calls = stub_app.state.errors = 0
+            llm.scheduler.retries = llm.scheduler.shed = 0
+            result = await drive(main.app, args.endpoints, args.requests, args.concurrency,
+                                 images, args.unique_images, args.language)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {
+            "requests": args.requests, "concurrency": args.concurrency, "endpoints": list(args.endpoints),
+            "unique_images": args.unique_images, "stub_latency_ms": args.stub_latency_ms,
+            "stub_jitter_ms": args.stub_jitter_ms, "stub_error_rate": args.stub_error_rate,
+            "stub_error_status": args.stub_error_status, "stub_tokens": args.stub_tokens,
+            "stub_token_interval_ms": args.stub_token_interval_ms,
+            "llm_rpm": llm.scheduler.requests.per_minute, "llm_tpm": llm.scheduler.tokens.per_minute,
+            "llm_concurrency": llm.scheduler.concurrency, "llm_queue_depth": llm.scheduler.queue_depth,
+        },
+        "stub": {"calls": stub_app.state.calls, "errors": stub_app.state.errors},
+        "scheduler": {"retries": llm.scheduler.retries, "shed": llm.scheduler.shed},
+        **result,
+    }
+
+
+def print_report(report):
+    print(f"Commit {report['commit']} · {report['config']['concurrency']} concurrent · "
+          f"{report['requests_per_sec']:.1f} req/s overall over {report['elapsed_sec']:.1f}s "
+          f"({report['stub']['calls']} stub calls, {report['stub']['errors']} stub errors)")
+    if "scheduler" in report:
+        print(f"  LLM scheduler: {report['scheduler']['retries']} retries, {report['scheduler']['shed']} shed")
+    for endpoint, stats in report["endpoints"].items():
+        latency = "  ".join(f"{k} {v:7.1f} ms" for k, v in stats["latency_ms"].items())
+        print(f"  {endpoint:<17} {stats['requests_per_sec']:7.1f} req/s  {latency}  "
+              f"errors {stats['error_rate'] * 100:5.1f}%")
+
+
+def compare(baseline, current):
+    """Print per-endpoint deltas between two saved reports."""
+    print(f"{baseline['commit']} → {current['commit']}")
+    if baseline["config"] != current["config"]:
+        print("  warning: the two runs used different configurations")
+    for endpoint in current["endpoints"]:
+        old, new = baseline["endpoints"].get(endpoint), current["endpoints"][endpoint]
+        if old is None:
+            print(f"  {endpoint:<17} (not in baseline)")
+            continue
+        parts = [f"req/s {old['requests_per_sec']:.1f} → {new['requests_per_sec']:.1f} "
+                 f"({(new['requests_per_sec'] / old['requests_per_sec'] - 1) * 100:+.1f}%)"]
+        for key, value in new["latency_ms"].items():
+            before = old["latency_ms"].get(key)
+            if before:
+                parts.append(f"{key} {before:.1f} → {value:.1f} ms ({(value / before - 1) * 100:+.1f}%)")
+        parts.append(f"errors {old['error_rate'] * 100:.1f}% → {new['error_rate'] * 100:.1f}%")
+        print(f"  {endpoint:<17} " + "  ".join(parts))
+
+
+def _add_stub_args(parser):
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0, help="Mean upstream latency")
+    parser.add_argument("--stub-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--stub-error-status", type=int, default=500, help="Status code of failed calls (e.g. 429)")
+    parser.add_argument("--stub-retry-after", type=float, default=None, help="Retry-After seconds sent with errors")
+    parser.add_argument("--stub-tokens", type=int, default=60, help="Tokens per text reply")
+    parser.add_argument("--stub-token-interval-ms", type=float, default=5.0, help="Delay between streamed tokens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API against a local Groq stand-in")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Start the stub and load test the app")
+    run_parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    run_parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--images", default=None, help="Directory of images for /predict (default: synthetic)")
+    run_parser.add_argument("--unique-images", action="store_true",
+                            help="Send a fresh synthetic image per /predict call so the prediction cache never hits")
+    run_parser.add_argument("--no-knowledge", action="store_true",
+                            help="Ignore the precomputed knowledge base so /predict always calls the stub")
+    run_parser.add_argument("--language", default="English")
+    run_parser.add_argument("--llm-rpm", type=float, default=None, help="Scheduler requests/min (0 = unlimited)")
+    run_parser.add_argument("--llm-tpm", type=float, default=None, help="Scheduler tokens/min (0 = unlimited)")
+    run_parser.add_argument("--llm-concurrency", type=int, default=None)
+    run_parser.add_argument("--llm-queue-depth", type=int, default=None, help="Waiting calls per priority before shedding")
+    run_parser.add_argument("--llm-max-retries", type=int, default=None)
+    run_parser.add_argument("--output", default=None, help="Write the report as JSON")
+    _add_stub_args(run_parser)
+
+    compare_parser = sub.add_parser("compare", help="Diff two saved reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    stub_parser = sub.add_parser("stub", help="Run only the Groq stand-in")
+    stub_parser.add_argument("--port", type=int, default=9000)
+    _add_stub_args(stub_parser)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f, open(args.current) as g:
+            compare(json.load(f), json.load(g))
+    elif args.command == "stub":
+        stub_app = create_stub_app(args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate,
+                                   args.stub_error_status, args.stub_retry_after, args.stub_tokens,
+                                   args.stub_token_interval_ms)
+        print(f"Groq stub at http://127.0.0.1:{args.port}/v1/chat/completions")
+        uvicorn.run(stub_app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        report = asyncio.run(run(args))
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Saved report to {args.output}")
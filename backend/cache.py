@@ -0,0 +1,237 @@
+"""
+Croply AI — Prediction Cache
+Bounded LRU + TTL cache for classifier results, keyed by a SHA-256 of the
+uploaded bytes and optionally (CROPLY_CACHE_PERCEPTUAL=1) by a perceptual
+hash of the decoded image so re-encoded copies of the same photo also hit.
+A perceptual hit is only served when a downscaled thumbnail of the upload is
+also close to the one stored with the entry, since unrelated images (and any
+flat frame) can share a dHash. An optional SQLite tier keeps entries across
+restarts, purged on TTL and capped at CROPLY_CACHE_DB_ROWS rows.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+CACHE_SIZE = int(os.getenv("CROPLY_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("CROPLY_CACHE_TTL", "86400"))
+CACHE_MAX_MB = float(os.getenv("CROPLY_CACHE_MAX_MB", "16"))
+CACHE_PERCEPTUAL = os.getenv("CROPLY_CACHE_PERCEPTUAL", "0") == "1"
+# Largest mean absolute difference (0-255) between the 16×16 grayscale
+# thumbnails of a perceptual hit and the upload for the hit to be served
+CACHE_PERCEPTUAL_MAX_DIFF = float(os.getenv("CROPLY_CACHE_PERCEPTUAL_MAX_DIFF", "4"))
+CACHE_DB = os.getenv("CROPLY_CACHE_DB", "")
+CACHE_DB_ROWS = int(os.getenv("CROPLY_CACHE_DB_ROWS", "100000"))
+
+_THUMB_SIZE = 16
+# SQLite writes between purges of expired and excess rows
+_PURGE_EVERY = 256
+
+
+def file_fingerprint(path: str) -> str:
+    """`path@<size>:<mtime_ns>`, so a file rewritten in place (e.g. retrained weights) gets a new value."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"{path}@missing"
+    return f"{path}@{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def content_key(data: bytes) -> str:
+    """Exact key: SHA-256 of the raw upload bytes."""
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def perceptual_key(image: np.ndarray) -> str:
+    """
+    64-bit difference hash (dHash) of a BGR image. Survives re-encoding,
+    resizing and small compression artefacts, but not crops or edits.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits((small[:, 1:] > small[:, :-1]).ravel())
+    return "dhash:" + bits.tobytes().hex()
+
+
+def thumbnail(image: np.ndarray) -> np.ndarray:
+    """16×16 grayscale thumbnail of a BGR image, the second check on a perceptual hit."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cv2.resize(gray, (_THUMB_SIZE, _THUMB_SIZE), interpolation=cv2.INTER_AREA)
+
+
+class PredictionCache:
+    """
+    In-memory LRU cache with per-entry TTL, bounded both by entry count and by
+    the approximate size of the stored values. `namespace` is mixed into every
+    key so results from a different model never collide.
+
+    Perceptual entries hold {"prediction", "thumbnail"}; use `get_similar`
+    and `put(..., image=...)` for them rather than the raw key.
+    """
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+                 perceptual=CACHE_PERCEPTUAL, db_path=CACHE_DB, namespace="", max_db_rows=CACHE_DB_ROWS,
+                 max_diff=CACHE_PERCEPTUAL_MAX_DIFF):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.perceptual = perceptual
+        self.max_diff = max_diff
+        self.namespace = namespace
+        self.max_db_rows = max_db_rows
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_expires_at ON predictions (expires_at)")
+            self._purge()
+            self._db.commit()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _full_key(self, key):
+        return f"{self.namespace}|{key}"
+
+    def get(self, key: Optional[str], count_miss: bool = True) -> Optional[dict]:
+        """
+        Return the cached value for `key`, or None. Pass count_miss=False for
+        a first-tier lookup that will be followed by another key.
+        """
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            value = self._lookup(self._full_key(key))
+            if value is not None:
+                self.hits += 1
+            elif count_miss:
+                self.misses += 1
+            return value
+
+    def get_similar(self, image: np.ndarray) -> Optional[dict]:
+        """
+        Cached value for a re-encoded copy of `image`, or None. The dHash only
+        finds the candidate; it is served if the thumbnails also match.
+        """
+        if not self.enabled or not self.perceptual:
+            return None
+        full_key = self._full_key(perceptual_key(image))
+        with self._lock:
+            entry = self._lookup(full_key)
+            if entry is not None:
+                stored = np.frombuffer(bytes.fromhex(entry["thumbnail"]), np.uint8).astype(np.int16)
+                diff = float(np.abs(stored - thumbnail(image).ravel()).mean())
+                if diff <= self.max_diff:
+                    self.hits += 1
+                    return entry["prediction"]
+            self.misses += 1
+            return None
+
+    def put(self, *keys: Optional[str], value: dict, image: Optional[np.ndarray] = None) -> None:
+        """
+        Store `value` under every non-None key, and under the perceptual key
+        of `image` (with its thumbnail) when perceptual matching is on.
+        """
+        if not self.enabled:
+            return
+        items = [(self._full_key(key), value) for key in keys if key is not None]
+        if image is not None and self.perceptual:
+            items.append((self._full_key(perceptual_key(image)),
+                          {"prediction": value, "thumbnail": thumbnail(image).tobytes().hex()}))
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for full_key, item in items:
+                encoded = json.dumps(item)
+                self._store(full_key, item, expires_at, len(encoded))
+                if self._db is not None:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO predictions (key, value, expires_at) VALUES (?, ?, ?)",
+                        (full_key, encoded, expires_at),
+                    )
+            if self._db is not None:
+                self._db_writes += len(items)
+                if self._db_writes >= _PURGE_EVERY:
+                    self._purge()
+                self._db.commit()
+
+    def _lookup(self, full_key):
+        # Memory first, then SQLite; called with the lock held
+        now = time.time()
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            expires_at, size, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(full_key)
+                return value
+            self._evict(full_key)
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM predictions WHERE key = ?", (full_key,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                value = json.loads(row[0])
+                self._store(full_key, value, row[1], len(row[0]))
+                self.disk_hits += 1
+                return value
+        return None
+
+    def _purge(self):
+        # Drop expired rows, then the soonest-to-expire (i.e. oldest) beyond the row cap
+        self._db_writes = 0
+        self._db.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+        excess = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.max_db_rows
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+
+    def _store(self, full_key, value, expires_at, value_size):
+        # Rough footprint: key + JSON value + fixed per-entry overhead
+        size = len(full_key) + value_size + 200
+        self._evict(full_key)
+        self._entries[full_key] = (expires_at, size, value)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, full_key):
+        entry = self._entries.pop(full_key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+            }
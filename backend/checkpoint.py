@@ -0,0 +1,160 @@
+"""
+Croply AI — Training Checkpoints
+Full training-state checkpoints (model, optimizer, scheduler, epoch,
+early-stopping counters, history and every RNG) written by a background
+thread so `torch.save` never stalls the training loop.
+
+Each file is written to a temporary name, fsynced and renamed into place, so
+a crash mid-write never leaves a torn checkpoint. Only the newest
+`keep_last` epoch checkpoints are kept.
+
+    checkpoints/
+        checkpoint_epoch_007.pt
+        checkpoint_epoch_008.pt
+        checkpoint_epoch_009.pt
+"""
+
+import os
+import re
+import queue
+import random
+import threading
+from typing import Optional
+
+import numpy as np
+import torch
+
+CHECKPOINT_DIR = os.getenv("CROPLY_CHECKPOINT_DIR", "checkpoints")
+KEEP_LAST = int(os.getenv("CROPLY_CHECKPOINT_KEEP", "3"))
+
+_PATTERN = re.compile(r"^checkpoint_epoch_(\d+)\.pt$")
+_STOP = object()
+
+
+def _snapshot(obj):
+    """Detached CPU copy of every tensor in a nested state dict."""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(v) for v in obj)
+    return obj
+
+
+def rng_state() -> dict:
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: dict) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def atomic_save(obj, path: str) -> None:
+    """torch.save to a temporary file, fsync, then rename over `path`."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def list_checkpoints(directory: str = CHECKPOINT_DIR) -> list:
+    """(epoch, path) of every epoch checkpoint in `directory`, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = _PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def latest_checkpoint(directory: str = CHECKPOINT_DIR) -> Optional[str]:
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1][1] if checkpoints else None
+
+
+def load_checkpoint(path: str) -> dict:
+    """Load a full training-state checkpoint onto the CPU."""
+    # Holds RNG state and history, not just tensors
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints on a daemon thread. `save` takes a CPU snapshot of the
+    state on the caller's thread (so training can keep mutating the live
+    tensors) and returns immediately; the write, rename and retention happen
+    in the background. At most `max_pending` writes are queued, after which
+    `save` blocks rather than piling up snapshots in memory.
+    """
+    def __init__(self, directory: str = CHECKPOINT_DIR, keep_last: int = KEEP_LAST, max_pending: int = 2):
+        self.directory = directory
+        self.keep_last = max(1, keep_last)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="croply-checkpoint", daemon=True)
+        self._thread.start()
+
+    def save(self, state: dict, epoch: int) -> None:
+        """Queue a full training-state checkpoint for `epoch` (0-based)."""
+        self._raise_pending_error()
+        path = os.path.join(self.directory, f"checkpoint_epoch_{epoch:03d}.pt")
+        self._queue.put((path, _snapshot(state), True))
+
+    def save_weights(self, state_dict: dict, path: str) -> None:
+        """Queue a weights-only file (e.g. best_leaf_model.pth), outside the retention policy."""
+        self._raise_pending_error()
+        self._queue.put((path, _snapshot(state_dict), False))
+
+    def wait(self) -> None:
+        """Block until every queued checkpoint is on disk."""
+        self._queue.join()
+        self._raise_pending_error()
+
+    def close(self) -> None:
+        self.wait()
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Background checkpoint write failed: {error}") from error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                path, state, prune = item
+                atomic_save(state, path)
+                if prune:
+                    self._prune()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        for _, path in list_checkpoints(self.directory)[:-self.keep_last]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,230 @@
+"""
+Croply AI — Server-side Chat Conversations
+Keeps /chat history on the server, keyed by a conversation id, so clients
+send only the new message. Conversations live in a bounded LRU with an idle
+TTL, optionally backed by SQLite so they survive restarts and evictions.
+
+With SQLite the database is the source of truth: every lookup reloads the
+conversation and appends number their rows inside one write transaction,
+so several processes (serve.py workers) can share one file. Without it a
+conversation exists only in the process that created it; callers get None
+for an id they don't hold and should ask the client to resend its history.
+
+Prompt size stays flat over long chats: once the not-yet-summarized turns
+exceed the history token budget, the oldest of them are folded into a
+rolling summary by the LLM in the background, and later prompts carry that
+summary plus only the recent turns.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from llm import HISTORY_TOKEN_BUDGET, estimate_tokens, summarize_conversation
+
+CONVERSATION_LIMIT = int(os.getenv("CROPLY_CONVERSATIONS", "10000"))
+CONVERSATION_TTL = float(os.getenv("CROPLY_CONVERSATION_TTL", "86400"))
+CONVERSATION_DB = os.getenv("CROPLY_CONVERSATION_DB", "")
+
+
+class Conversation:
+    """
+    One chat. `messages` holds only the turns not yet folded into `summary`;
+    `summarized` counts the folded ones, so `summarized + len(messages)` is
+    the position of the next message in the full transcript.
+    """
+    __slots__ = ("id", "messages", "summary", "summarized", "updated_at")
+
+    def __init__(self, conversation_id, messages=None, summary=None, summarized=0, updated_at=None):
+        self.id = conversation_id
+        self.messages = messages or []
+        self.summary = summary
+        self.summarized = summarized
+        self.updated_at = updated_at or time.time()
+
+    def pending_tokens(self):
+        return sum(estimate_tokens(m["content"]) for m in self.messages)
+
+
+class ConversationStore:
+    """
+    Bounded in-memory LRU of conversations, expired after `ttl` seconds idle.
+    With `db_path` every message is also written to SQLite, and conversations
+    evicted from memory are reloaded from there on their next request.
+    """
+    def __init__(self, max_conversations=CONVERSATION_LIMIT, ttl=CONVERSATION_TTL, db_path=CONVERSATION_DB,
+                 history_budget=HISTORY_TOKEN_BUDGET):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.history_budget = history_budget
+        self.summaries = 0
+        self._entries = OrderedDict()
+        self._summarizing = set()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+            # Readers never block the other workers' writers
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, summary TEXT, summarized INTEGER, updated_at REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "conversation_id TEXT, seq INTEGER, role TEXT, content TEXT, "
+                "PRIMARY KEY (conversation_id, seq))"
+            )
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """
+        The live conversation, or None if unknown (to this process, without
+        SQLite) or idle past the TTL. With SQLite it is reloaded every time,
+        since another worker may have added turns or a summary.
+        """
+        with self._lock:
+            if self._db is not None:
+                conversation = self._load(conversation_id)
+                if conversation is not None:
+                    self._store(conversation)
+            else:
+                conversation = self._entries.get(conversation_id)
+            if conversation is None:
+                return None
+            if conversation.updated_at + self.ttl < time.time():
+                self._delete(conversation_id)
+                return None
+            self._entries.move_to_end(conversation_id)
+            return conversation
+
+    def create(self, conversation_id: Optional[str] = None, messages=()) -> Conversation:
+        """
+        Start a conversation, replacing any stored under `conversation_id`.
+        `messages` seeds it, e.g. with the history a client resent after
+        being told its conversation was unknown.
+        """
+        conversation = Conversation(conversation_id or uuid.uuid4().hex)
+        with self._lock:
+            self._delete(conversation.id)
+            self._store(conversation)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO conversations (id, summary, summarized, updated_at) VALUES (?, ?, ?, ?)",
+                    (conversation.id, None, 0, conversation.updated_at),
+                )
+                self._db.commit()
+        if messages:
+            self.append(conversation, *messages)
+        return conversation
+
+    def append(self, conversation: Conversation, *messages: dict) -> None:
+        """Add {role, content} messages to the end of the transcript."""
+        with self._lock:
+            conversation.messages.extend({"role": m["role"], "content": m["content"]} for m in messages)
+            conversation.updated_at = time.time()
+            if self._db is not None:
+                # IMMEDIATE takes the write lock before reading the next seq, so
+                # workers appending to the same conversation never reuse one
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    start = self._db.execute(
+                        "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?", (conversation.id,)
+                    ).fetchone()[0]
+                    self._db.executemany(
+                        "INSERT INTO messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                        [(conversation.id, start + i, m["role"], m["content"]) for i, m in enumerate(messages)],
+                    )
+                    self._db.execute("UPDATE conversations SET updated_at = ? WHERE id = ?",
+                                     (conversation.updated_at, conversation.id))
+                except Exception:
+                    self._db.rollback()
+                    raise
+                self._db.commit()
+
+    def prompt_context(self, conversation: Conversation) -> tuple:
+        """(history, summary) to send with the next message of `conversation`."""
+        with self._lock:
+            return list(conversation.messages), conversation.summary
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._delete(conversation_id)
+
+    async def summarize(self, conversation: Conversation, language: str = "English") -> bool:
+        """
+        If the unsummarized turns exceed the budget, fold the oldest of them
+        into the summary until the rest fit in half the budget (so this runs
+        every few turns, not every turn). Returns True if it summarized.
+        """
+        if conversation.id in self._summarizing or conversation.pending_tokens() <= self.history_budget:
+            return False
+        self._summarizing.add(conversation.id)
+        try:
+            with self._lock:
+                messages, previous = list(conversation.messages), conversation.summary
+            keep_tokens, fold = 0, len(messages)
+            while fold > 0 and keep_tokens + estimate_tokens(messages[fold - 1]["content"]) <= self.history_budget // 2:
+                fold -= 1
+                keep_tokens += estimate_tokens(messages[fold]["content"])
+            summary = await summarize_conversation(messages[:fold], previous, language)
+            with self._lock:
+                if self._db is not None:
+                    # Only if no other worker summarized this conversation meanwhile
+                    updated = self._db.execute(
+                        "UPDATE conversations SET summary = ?, summarized = ? WHERE id = ? AND summarized = ?",
+                        (summary, conversation.summarized + fold, conversation.id, conversation.summarized),
+                    ).rowcount
+                    self._db.commit()
+                    if not updated:
+                        return False
+                # Only this task removes from the front, so the first `fold` are still the folded turns
+                del conversation.messages[:fold]
+                conversation.summarized += fold
+                conversation.summary = summary
+                self.summaries += 1
+            return True
+        finally:
+            self._summarizing.discard(conversation.id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"conversations": len(self._entries), "summaries": self.summaries}
+
+    # ── internals (called with the lock held) ────────────────────────────
+    def _store(self, conversation):
+        self._entries[conversation.id] = conversation
+        self._entries.move_to_end(conversation.id)
+        while len(self._entries) > self.max_conversations:
+            # Evicted conversations stay in SQLite (if configured) and reload on demand
+            self._entries.popitem(last=False)
+
+    def _load(self, conversation_id):
+        row = self._db.execute(
+            "SELECT summary, summarized, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        summary, summarized, updated_at = row
+        messages = [
+            {"role": role, "content": content}
+            for role, content in self._db.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? AND seq >= ? ORDER BY seq",
+                (conversation_id, summarized),
+            )
+        ]
+        return Conversation(conversation_id, messages, summary, summarized, updated_at)
+
+    def _delete(self, conversation_id):
+        self._entries.pop(conversation_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self._db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            self._db.commit()
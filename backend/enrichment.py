@@ -0,0 +1,106 @@
+"""
+Croply AI — Disease Info Enrichment Jobs
+In-process job table that lets /predict answer with the classification as
+soon as it is ready, while the disease info for it is fetched in the
+background. Clients pick the result up from GET /predict/{job_id}/info or
+from the second NDJSON line of a streamed /predict response.
+
+Concurrent jobs for the same (class, language) share one fetch. Finished
+jobs are kept for `ttl` seconds and at most `max_jobs` are tracked. A fetch
+that raises marks its jobs `failed` (with the exception's `retry_after`, if
+it has one) so clients know to try again rather than keep a placeholder.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+# "inline" waits for the info before responding (the original behaviour),
+# "poll" returns a job id at once, "stream" sends the info as a second line
+ENRICHMENT_MODES = ("inline", "poll", "stream")
+ENRICHMENT_MODE = os.getenv("CROPLY_PREDICT_ENRICHMENT", "inline")
+ENRICHMENT_JOBS = int(os.getenv("CROPLY_ENRICHMENT_JOBS", "4096"))
+ENRICHMENT_TTL = float(os.getenv("CROPLY_ENRICHMENT_TTL", "600"))
+
+
+class EnrichmentJobs:
+    """
+    Maps job ids to asyncio tasks. `start` must be called from the event
+    loop; the task itself is shared with every other pending job for the
+    same key, so a burst of uploads of one disease costs one LLM call.
+    """
+    def __init__(self, max_jobs: int = ENRICHMENT_JOBS, ttl: float = ENRICHMENT_TTL):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def pending(self) -> int:
+        """Distinct fetches still running."""
+        return len(self._pending)
+
+    def start(self, key: tuple, fetch: Callable[[], Awaitable[dict]]) -> str:
+        """Start (or join) the fetch for `key` and return a new job id."""
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+
+        now = time.monotonic()
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = (task, now)
+        # Oldest first: drop expired jobs, then any over the limit
+        while self._jobs and (len(self._jobs) > self.max_jobs
+                              or next(iter(self._jobs.values()))[1] + self.ttl < now):
+            self._jobs.popitem(last=False)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[asyncio.Future]:
+        """The job's task, or None if unknown or expired."""
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return None
+        task, created = entry
+        if created + self.ttl < time.monotonic():
+            del self._jobs[job_id]
+            return None
+        return task
+
+    async def wait(self, job_id: str, timeout: float = 0.0) -> Optional[dict]:
+        """
+        {'status', 'disease_information'} for a job, waiting up to `timeout`
+        seconds for it to finish. None if the job is unknown or expired.
+        """
+        task = self.get(job_id)
+        if task is None:
+            return None
+        if not task.done() and timeout > 0:
+            # asyncio.wait never cancels the task, so a client dropping its long poll is harmless
+            await asyncio.wait([task], timeout=timeout)
+        return self.result(task)
+
+    @staticmethod
+    def result(task: asyncio.Future) -> dict:
+        """{'status', 'disease_information'} of a job's task, plus 'retry_after' when it failed with one."""
+        if not task.done():
+            return {"status": "pending", "disease_information": None}
+        if task.cancelled():
+            return {"status": "failed", "disease_information": None}
+        if task.exception() is not None:
+            return {"status": "failed", "disease_information": None,
+                    "retry_after": getattr(task.exception(), "retry_after", None)}
+        return {"status": "done", "disease_information": task.result()}
+
+    def _finished(self, key, task):
+        self._pending.pop(key, None)
+        # Mark the exception as retrieved; it is reported through `result`
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,321 @@
+"""
+Croply AI — Offline Evaluation
+Runs a held-out class-per-directory split through the production inference
+path (upload bytes → ingest.decode_image → preprocess_batch → classify_batch)
+in batches and reports, in one pass:
+
+  • accuracy, confusion matrix and per-class precision / recall
+  • calibration against CONFIDENCE_THRESHOLD (the "not a clear leaf" cut-off
+    in main.py) and a reliability table / expected calibration error
+  • images/sec and p50/p95/p99 batch latency, split by stage
+  • with --gate, how often the leaf-validity gate would reject these (all
+    leaf) images, i.e. its false-reject rate, and how long it takes
+  • with --cascade, the same for the student→teacher cascade, plus the
+    share of images escalated to the teacher and the end-to-end speedup
+
+    python evaluate.py --data-dir Datasets/PlantVillage/val --output eval.json
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from ingest import decode_image
+from preprocessing import INPUT_SIZE, preprocess_batch, leaf_gate, GATE_MIN_STD, GATE_MIN_PLANT_FRACTION
+from predict import (ModelRegistry, CascadeClassifier, CONFIDENCE_THRESHOLD, MODEL_PATH, CLASS_MAPPING_PATH,
+                     STUDENT_MODEL_PATH, CASCADE_THRESHOLD, classify_batch)
+from shards import list_images
+
+
+def confusion_matrix(labels, predictions, num_classes):
+    """(num_classes, num_classes) counts, rows = true class, columns = predicted."""
+    labels, predictions = np.asarray(labels, dtype=np.int64), np.asarray(predictions, dtype=np.int64)
+    counts = np.bincount(labels * num_classes + predictions, minlength=num_classes * num_classes)
+    return counts.reshape(num_classes, num_classes)
+
+
+def per_class_metrics(matrix, class_names):
+    """Precision, recall and support per class from a confusion matrix."""
+    true_positives = np.diag(matrix)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positives / predicted, np.nan)
+        recall = np.where(support > 0, true_positives / support, np.nan)
+    # Classes absent from both the split and the predictions are left out
+    return {
+        name: {"precision": float(precision[i]), "recall": float(recall[i]), "support": int(support[i])}
+        for i, name in enumerate(class_names)
+        if support[i] > 0 or predicted[i] > 0
+    }
+
+
+def calibration(confidences, correct, threshold=CONFIDENCE_THRESHOLD, bins=10):
+    """
+    How well confidence tracks accuracy, and what the serving threshold does:
+    `rejected` predictions are the ones /predict would report as not a leaf.
+    """
+    confidences, correct = np.asarray(confidences), np.asarray(correct, dtype=bool)
+    accepted = confidences >= threshold
+
+    edges = np.linspace(0, 100, bins + 1)
+    index = np.clip(np.digitize(confidences, edges[1:-1]), 0, bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    conf_sum = np.bincount(index, weights=confidences, minlength=bins)
+    correct_sum = np.bincount(index, weights=correct, minlength=bins)
+
+    table, ece = [], 0.0
+    for b in range(bins):
+        if counts[b]:
+            mean_conf, accuracy = conf_sum[b] / counts[b], 100 * correct_sum[b] / counts[b]
+            ece += counts[b] / len(confidences) * abs(mean_conf - accuracy)
+            table.append({"bin": f"{edges[b]:.0f}-{edges[b + 1]:.0f}", "count": int(counts[b]),
+                          "mean_confidence": float(mean_conf), "accuracy": float(accuracy)})
+
+    def rate(mask):
+        return float(correct[mask].mean() * 100) if mask.any() else None
+
+    return {
+        "threshold": threshold,
+        "accepted_fraction": float(accepted.mean()),
+        "accuracy_accepted": rate(accepted),
+        "accuracy_rejected": rate(~accepted),
+        # Correct predictions the threshold throws away
+        "correct_rejected_fraction": float((correct & ~accepted).sum() / max(correct.sum(), 1)),
+        "expected_calibration_error": float(ece),
+        "reliability": table,
+    }
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)} if len(values) else {}
+
+
+def evaluate(model_registry, data_dir, batch_size=16, limit=0, warmup=1, cascade=None):
+    """
+    Classify every image under `data_dir` and return the full report. With a
+    `cascade` the images go through it instead of straight to the registry.
+    """
+    model_registry.load()
+    if cascade is not None:
+        cascade.load()
+        classify = cascade.classify
+    else:
+        def classify(batch):
+            return classify_batch(batch, model_registry)
+    class_names = list(model_registry.class_names)
+    classes, paths, labels = list_images(data_dir)
+
+    unknown = sorted(set(classes) - set(class_names))
+    if unknown:
+        raise ValueError(f"Classes not known to the model: {', '.join(unknown)}")
+    # Directory labels → model class indices
+    labels = [class_names.index(classes[label]) for label in labels]
+    if limit:
+        order = np.random.default_rng(0).permutation(len(paths))[:limit]
+        paths, labels = [paths[i] for i in order], [labels[i] for i in order]
+
+    buffer = torch.empty((batch_size, 3, INPUT_SIZE, INPUT_SIZE))
+    for _ in range(warmup):
+        classify(buffer.normal_())
+    if cascade is not None:
+        # Warm-up batches shouldn't count towards the escalation rate
+        cascade.reset_stats()
+
+    predictions, confidences = [], []
+    timings = {"load": [], "preprocess": [], "forward": [], "total": []}
+    started = time.perf_counter()
+
+    for start in range(0, len(paths), batch_size):
+        t0 = time.perf_counter()
+        images = []
+        for path in paths[start:start + batch_size]:
+            with open(path, "rb") as f:
+                images.append(decode_image(f.read()))
+        t1 = time.perf_counter()
+        batch = preprocess_batch(images, out=buffer)
+        t2 = time.perf_counter()
+        results = classify(batch)
+        t3 = time.perf_counter()
+
+        for key, value in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t3 - t0)):
+            timings[key].append(value * 1000)
+        predictions.extend(class_names.index(r["category"]) for r in results)
+        confidences.extend(r["confidence"] for r in results)
+
+    elapsed = time.perf_counter() - started
+    labels, predictions = np.asarray(labels), np.asarray(predictions)
+    correct = labels == predictions
+    matrix = confusion_matrix(labels, predictions, len(class_names))
+
+    report = {
+        "model": model_registry.model_path,
+        "data_dir": data_dir,
+        "images": len(paths),
+        "batch_size": batch_size,
+        "accuracy": float(correct.mean() * 100) if len(paths) else None,
+        "images_per_sec": len(paths) / elapsed if elapsed else None,
+        "latency_ms": {stage: percentiles(values) for stage, values in timings.items()},
+        "calibration": calibration(confidences, correct),
+        "per_class": per_class_metrics(matrix, class_names),
+        "confusion_matrix": {"classes": class_names, "counts": matrix.tolist()},
+    }
+    if cascade is not None:
+        report["cascade"] = {"student": cascade.student.model_path, "threshold": cascade.threshold,
+                             **cascade.stats()}
+    return report
+
+
+def compare_cascade(teacher_report, cascade_report):
+    """Accuracy cost and end-to-end speedup of the cascade over the teacher alone."""
+    stats = cascade_report["cascade"]
+    return {
+        "threshold": stats["threshold"],
+        "escalation_rate": stats["escalation_rate"],
+        "teacher_accuracy": teacher_report["accuracy"],
+        "cascade_accuracy": cascade_report["accuracy"],
+        "speedup": cascade_report["images_per_sec"] / teacher_report["images_per_sec"],
+        "p50_batch_speedup": (teacher_report["latency_ms"]["total"]["p50"]
+                              / cascade_report["latency_ms"]["total"]["p50"]),
+    }
+
+
+def gate_report(data_dir, limit=0, negatives_dir=None, **thresholds):
+    """
+    Run the leaf-validity gate over a leaf-only split and report the false-
+    reject rate overall, per reason and per class. Images in `negatives_dir`
+    (any layout of non-leaf photos) give the true-reject rate as well.
+    """
+    classes, paths, labels = list_images(data_dir)
+    if limit:
+        order = np.random.default_rng(0).permutation(len(paths))[:limit]
+        paths, labels = [paths[i] for i in order], [labels[i] for i in order]
+
+    def run(image_paths):
+        reasons, timings = [], []
+        for path in image_paths:
+            with open(path, "rb") as f:
+                image = decode_image(f.read())
+            start = time.perf_counter()
+            verdict = leaf_gate(image, **thresholds)
+            timings.append((time.perf_counter() - start) * 1000)
+            reasons.append(verdict.reason)
+        return reasons, timings
+
+    reasons, timings = run(paths)
+    rejected = [r is not None for r in reasons]
+    per_class = {}
+    for label, is_rejected in zip(labels, rejected):
+        total, count = per_class.get(classes[label], (0, 0))
+        per_class[classes[label]] = (total + 1, count + is_rejected)
+
+    report = {
+        "data_dir": data_dir,
+        "images": len(paths),
+        "thresholds": thresholds,
+        "false_reject_rate": sum(rejected) / len(paths) if paths else None,
+        "rejections_by_reason": {r: reasons.count(r) for r in sorted({r for r in reasons if r})},
+        "false_reject_rate_per_class": {name: count / total for name, (total, count) in per_class.items() if count},
+        "latency_ms": percentiles(timings),
+    }
+    if negatives_dir:
+        negatives = [os.path.join(root, name) for root, _, names in os.walk(negatives_dir) for name in sorted(names)
+                     if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+        negative_reasons, _ = run(negatives)
+        report["negatives"] = len(negatives)
+        report["true_reject_rate"] = (sum(r is not None for r in negative_reasons) / len(negatives)
+                                      if negatives else None)
+    return report
+
+
+def print_gate_report(report):
+    print(f"Leaf gate on {report['images']} leaf images from {report['data_dir']}: "
+          f"{report['false_reject_rate'] * 100:.2f}% falsely rejected "
+          + "  ".join(f"{reason} {count}" for reason, count in report["rejections_by_reason"].items()))
+    print("  latency " + "  ".join(f"{k} {v:.2f} ms" for k, v in report["latency_ms"].items()))
+    for name, rate in sorted(report["false_reject_rate_per_class"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<50} {rate * 100:6.2f}% rejected")
+    if "true_reject_rate" in report and report["true_reject_rate"] is not None:
+        print(f"Non-leaf images: {report['true_reject_rate'] * 100:.2f}% of {report['negatives']} rejected")
+
+
+def print_report(report):
+    print(f"Evaluated {report['images']} images from {report['data_dir']} with {report['model']}")
+    print(f"Accuracy: {report['accuracy']:.2f}%  ·  {report['images_per_sec']:.1f} images/sec "
+          f"(batch size {report['batch_size']})")
+    for stage, values in report["latency_ms"].items():
+        print(f"  {stage:<10} " + "  ".join(f"{k} {v:7.1f} ms" for k, v in values.items()))
+
+    cal = report["calibration"]
+    above, below = (f"{v:.2f}%" if v is not None else "n/a" for v in (cal["accuracy_accepted"], cal["accuracy_rejected"]))
+    print(f"Threshold {cal['threshold']:.0f}%: {cal['accepted_fraction'] * 100:.1f}% accepted, "
+          f"accuracy above {above} / below {below}, "
+          f"{cal['correct_rejected_fraction'] * 100:.1f}% of correct predictions rejected")
+    print(f"Expected calibration error: {cal['expected_calibration_error']:.2f} points")
+    for row in cal["reliability"]:
+        print(f"  {row['bin']:>7}%  n={row['count']:<6} confidence {row['mean_confidence']:5.1f}  "
+              f"accuracy {row['accuracy']:5.1f}")
+
+    if "cascade" in report:
+        c = report["cascade"]
+        print(f"Cascade: student {c['student']} at {c['threshold']:.0f}% — "
+              f"{c['escalation_rate'] * 100:.1f}% of images escalated to the teacher")
+
+    print("Per-class precision / recall:")
+    for name, m in report["per_class"].items():
+        print(f"  {name:<50} P {m['precision'] * 100:6.2f}  R {m['recall'] * 100:6.2f}  n={m['support']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate accuracy, calibration and throughput of the classifier")
+    parser.add_argument("--data-dir", default="Datasets/PlantVillage/val")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate a random subset of this many images (0 = all)")
+    parser.add_argument("--output", default=None, help="Write the full report as JSON")
+    parser.add_argument("--gate", action="store_true",
+                        help="Only measure the leaf-validity gate's false-reject rate (no model needed)")
+    parser.add_argument("--negatives", default=None, help="Directory of non-leaf images for --gate")
+    parser.add_argument("--gate-min-std", type=float, default=GATE_MIN_STD)
+    parser.add_argument("--gate-min-plant-fraction", type=float, default=GATE_MIN_PLANT_FRACTION)
+    parser.add_argument("--cascade", action="store_true",
+                        help="Also evaluate the student→teacher cascade and report escalation rate and speedup")
+    parser.add_argument("--student-path", default=STUDENT_MODEL_PATH)
+    parser.add_argument("--threshold", type=float, default=CASCADE_THRESHOLD,
+                        help="Student confidence (%%) below which the cascade escalates")
+    args = parser.parse_args()
+
+    if args.gate:
+        report = gate_report(args.data_dir, args.limit, args.negatives, min_std=args.gate_min_std,
+                             min_plant_fraction=args.gate_min_plant_fraction)
+        print_gate_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Saved report to {args.output}")
+        raise SystemExit(0)
+
+    registry = ModelRegistry(args.model_path, args.class_mapping)
+    report = evaluate(registry, args.data_dir, args.batch_size, args.limit)
+    print_report(report)
+    if args.cascade:
+        cascade = CascadeClassifier(ModelRegistry(args.student_path, args.class_mapping), registry, args.threshold)
+        cascade_report = evaluate(registry, args.data_dir, args.batch_size, args.limit, cascade=cascade)
+        print()
+        print_report(cascade_report)
+        summary = compare_cascade(report, cascade_report)
+        print(f"\nCascade vs teacher: {summary['speedup']:.2f}× images/sec, "
+              f"{summary['p50_batch_speedup']:.2f}× p50 batch latency, "
+              f"accuracy {summary['teacher_accuracy']:.2f}% → {summary['cascade_accuracy']:.2f}%, "
+              f"{summary['escalation_rate'] * 100:.1f}% escalated")
+        report = {"teacher": report, "cascade": cascade_report, "comparison": summary}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.output}")
@@ -0,0 +1,104 @@
+"""
+Croply AI — Graph-optimized Model Export
+Turns the eager training checkpoint into deployment artifacts that load
+without rebuilding the model in Python:
+
+  • TorchScript — BatchNorm folded into Conv/Linear, Dropout removed,
+    channels_last weights, frozen graph (leaf_disease_model.ts)
+  • ONNX — same folded graph with a dynamic batch axis (leaf_disease_model.onnx)
+
+Both embed the class names. Serve either with CROPLY_MODEL_PATH=<artifact>.
+
+    python export.py --format all
+"""
+
+import json
+import argparse
+
+import torch
+import torch.nn as nn
+from torch.fx.experimental.optimization import fuse
+
+from preprocessing import INPUT_SIZE
+from predict import ModelRegistry, MODEL_PATH, CLASS_MAPPING_PATH, classify_batch
+
+
+def optimize_for_export(model):
+    """
+    Inference-only copy of the classifier: Dropout replaced by Identity and
+    every BatchNorm folded into the Conv2d / Linear before it.
+    """
+    model = fuse(model.eval())
+    for name, module in list(model.named_modules()):
+        if isinstance(module, nn.Dropout):
+            parent_name, _, child_name = name.rpartition(".")
+            setattr(model.get_submodule(parent_name) if parent_name else model, child_name, nn.Identity())
+    model.graph.eliminate_dead_code()
+    model.recompile()
+    return model
+
+
+def export_torchscript(model, path, class_names):
+    """Trace in channels_last, freeze, and save with the class names embedded."""
+    model = model.to(memory_format=torch.channels_last)
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE).contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example).eval())
+    extra_files = {
+        "class_names.json": json.dumps(class_names),
+        "metadata.json": json.dumps({"format": "torchscript", "memory_format": "channels_last"}),
+    }
+    torch.jit.save(scripted, path, _extra_files=extra_files)
+
+
+def export_onnx(model, path, class_names, opset=17):
+    """Export with a dynamic batch axis and store the class names as model metadata."""
+    import onnx
+
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    torch.onnx.export(
+        model, (example,), path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset, dynamo=False,
+    )
+    onnx_model = onnx.load(path)
+    onnx.helper.set_model_props(onnx_model, {"class_names": json.dumps(class_names)})
+    onnx.save(onnx_model, path)
+
+
+def verify(source, artifact_path, batch_size=4):
+    """Max logit difference and top-1 agreement of an artifact vs the eager model."""
+    exported = ModelRegistry(artifact_path).load()
+
+    batch = torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.inference_mode():
+        diff = (source.model(batch) - exported.model(batch)).abs().max().item()
+    agree = all(a["category"] == b["category"]
+                for a, b in zip(classify_batch(batch, source), classify_batch(batch, exported)))
+    return diff, agree
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the classifier to TorchScript / ONNX")
+    parser.add_argument("--format", choices=["torchscript", "onnx", "all"], default="all")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--torchscript-output", default="leaf_disease_model.ts")
+    parser.add_argument("--onnx-output", default="leaf_disease_model.onnx")
+    args = parser.parse_args()
+
+    source = ModelRegistry(args.model_path, args.class_mapping, variant="fp32").load()
+    optimized = optimize_for_export(source.model)
+
+    outputs = []
+    if args.format in ("torchscript", "all"):
+        export_torchscript(optimized, args.torchscript_output, source.class_names)
+        outputs.append(args.torchscript_output)
+    if args.format in ("onnx", "all"):
+        export_onnx(optimize_for_export(source.model), args.onnx_output, source.class_names)
+        outputs.append(args.onnx_output)
+
+    for path in outputs:
+        diff, agree = verify(source, path)
+        print(f"Saved {path} — max logit diff {diff:.2e}, top-1 {'matches' if agree else 'DIFFERS'}")
@@ -0,0 +1,132 @@
+"""
+Croply AI — Micro-batching Inference Engine
+Collects preprocessed images from concurrent /predict requests and runs them
+through the classifier as one batch on a dedicated worker thread.
+"""
+
+import os
+import queue
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from predict import classify_batch, registry, cascade
+from metrics import STAGE_SECONDS, BATCH_SIZE, Callback
+
+MAX_BATCH_SIZE = int(os.getenv("CROPLY_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("CROPLY_MAX_WAIT_MS", "10"))
+
+_STOP = object()
+
+
+class InferenceEngine:
+    """
+    Dynamic micro-batcher in front of `classify_batch`.
+
+    Requests are queued as (tensor, future, enqueued_at) tuples. The worker
+    thread takes the first waiting item, then keeps collecting until it has
+    `max_batch_size` items or `max_wait_ms` has elapsed, and runs the whole
+    batch in a single forward pass. The forward pass never runs on the
+    asyncio event loop. With a `cascade` (predict.CascadeClassifier) the batch
+    goes through the student first instead of straight to `model_registry`.
+    """
+    def __init__(self, model_registry=None, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, cascade=None):
+        self.model_registry = model_registry or registry
+        self.cascade = cascade
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the worker thread (idempotent)."""
+        if not self.is_running:
+            self._thread = threading.Thread(target=self._run, name="croply-inference", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Ask the worker to finish the queued work and exit."""
+        if self.is_running:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, tensor):
+        """
+        Queue a single (3, 224, 224) tensor and return a concurrent Future that
+        resolves to its {'category', 'confidence'} result.
+        """
+        if not self.is_running:
+            self.start()
+        future = Future()
+        self._queue.put((tensor, future, time.perf_counter()))
+        return future
+
+    async def predict(self, tensor):
+        """Awaitable wrapper around `submit` for use inside async handlers."""
+        return await asyncio.wrap_future(self.submit(tensor))
+
+    def _collect(self, first):
+        """Gather up to `max_batch_size` items, waiting at most `max_wait`."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Re-queue the sentinel so the loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            # Drop requests whose callers went away while queued
+            batch = [(t, f, q) for t, f, q in self._collect(first) if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            tensors, futures, enqueued = zip(*batch)
+            now = time.perf_counter()
+            for enqueued_at in enqueued:
+                STAGE_SECONDS.observe(now - enqueued_at, "queue_wait")
+            BATCH_SIZE.observe(len(batch))
+            try:
+                images = torch.stack(tensors)
+                if self.cascade is not None:
+                    results = self.cascade.classify(images)
+                else:
+                    results = classify_batch(images, self.model_registry)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+# Shared engine used by the API
+engine = InferenceEngine(cascade=cascade)
+
+Callback("croply_inference_queue_depth", "Images waiting for the batching engine", "gauge",
+         lambda: engine.queue_depth)
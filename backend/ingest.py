@@ -0,0 +1,97 @@
+"""
+Croply AI — Image Ingestion
+Validates and decodes uploaded images straight from memory. JPEGs are decoded
+at a reduced DCT scale so large phone photos never get materialised at full
+resolution before being shrunk for the classifier.
+"""
+
+import io
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("CROPLY_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+
+# PlantVillage images are 256×256, so the segmentation in preprocessing runs
+# at roughly the scale it saw during training before the final 224×224 resize.
+DECODE_MIN_SIDE = 256
+
+# cv2 flags for libjpeg's 1/2, 1/4 and 1/8 scaled decoding, largest first
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def detect_image_type(data: bytes) -> Optional[str]:
+    """
+    Identify the image format from its magic bytes. Returns the same names
+    as the old `imghdr.what` ('jpeg', 'png', ...) or None if unrecognised.
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if data[:2] == b"BM":
+        return "bmp"
+    return None
+
+
+def _jpeg_reduced_flag(data: bytes, min_side: int) -> int:
+    """Pick the strongest DCT downscale that keeps the short side >= min_side."""
+    try:
+        # Image.open only parses the header — no pixels are decoded here
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        return cv2.IMREAD_COLOR
+
+    short_side = min(width, height)
+    for scale, flag in _REDUCED_FLAGS:
+        if short_side // scale >= min_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(data: bytes, min_side: int = DECODE_MIN_SIDE) -> np.ndarray:
+    """
+    Decode image bytes into a BGR array whose shorter side is at most
+    `min_side` (smaller images are left untouched).
+    Raises ValueError if the bytes cannot be decoded.
+    """
+    flag = cv2.IMREAD_COLOR
+    if detect_image_type(data) == "jpeg":
+        flag = _jpeg_reduced_flag(data, min_side)
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        raise ValueError("Unable to decode image data")
+
+    # Finish the downscale (non-JPEG formats, or what the DCT scale left over)
+    height, width = image.shape[:2]
+    short_side = min(height, width)
+    if short_side > min_side:
+        ratio = min_side / short_side
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    return image
+
+
+def load_image(image_path: str, min_side: int = DECODE_MIN_SIDE) -> np.ndarray:
+    """Read an image file from disk through the same reduced-resolution path."""
+    with open(image_path, "rb") as f:
+        data = f.read()
+    try:
+        return decode_image(data, min_side)
+    except ValueError:
+        raise FileNotFoundError(f"Error: Unable to load image from {image_path}")
@@ -0,0 +1,172 @@
+"""
+Croply AI — Disease Information Knowledge Base
+Precomputed `get_disease_info` answers for every (class, language) pair,
+stored in a small SQLite file and held in memory while the API runs.
+Misses fall back to the live LLM and the validated answer is stored
+when the language is one of LANGUAGES.
+
+Build it offline with:
+    python knowledge.py build [--languages English Hindi ...] [--force]
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+from typing import Optional
+
+from llm import get_disease_info as llm_disease_info, close_client
+
+KNOWLEDGE_DB = os.getenv("CROPLY_KNOWLEDGE_DB", "disease_info.db")
+
+# Same languages the frontend offers (LanguageContext.jsx)
+LANGUAGES = ["English", "Hindi", "Spanish", "French", "German", "Portuguese", "Chinese", "Arabic"]
+
+_LIST_FIELDS = ("symptoms", "causes", "prevention")
+_TREATMENT_FIELDS = ("method", "description", "effectiveness")
+
+
+def validate_disease_info(info) -> bool:
+    """Check that an LLM answer matches the JSON schema requested in llm.get_disease_info."""
+    if not isinstance(info, dict) or "raw_content" in info:
+        return False
+    if not all(isinstance(info.get(key), str) and info[key].strip() for key in ("name", "description")):
+        return False
+    for key in _LIST_FIELDS:
+        value = info.get(key)
+        if not isinstance(value, list) or not value or not all(isinstance(v, str) for v in value):
+            return False
+    treatments = info.get("treatment_options")
+    if not isinstance(treatments, list) or not treatments:
+        return False
+    return all(isinstance(t, dict) and all(k in t for k in _TREATMENT_FIELDS) for t in treatments)
+
+
+class KnowledgeBase:
+    """
+    SQLite-backed store of disease information. The whole table is loaded
+    into a dict on open, so lookups on the request path never touch disk.
+    """
+    def __init__(self, db_path=KNOWLEDGE_DB):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS disease_info ("
+            "class_name TEXT, language TEXT, info TEXT, source TEXT, created_at REAL, "
+            "PRIMARY KEY (class_name, language))"
+        )
+        self._db.commit()
+        self._entries = {
+            (class_name, language): json.loads(info)
+            for class_name, language, info in self._db.execute(
+                "SELECT class_name, language, info FROM disease_info"
+            )
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries)
+
+    def get(self, class_name: str, language: str) -> Optional[dict]:
+        """Stored disease info for the pair, or None. Counts hits and misses."""
+        info = self._entries.get((class_name, language))
+        if info is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return info
+
+    def put(self, class_name: str, language: str, info: dict, source: str = "build") -> None:
+        with self._lock:
+            self._entries[(class_name, language)] = info
+            self._db.execute(
+                "INSERT OR REPLACE INTO disease_info (class_name, language, info, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (class_name, language, json.dumps(info, ensure_ascii=False), source, time.time()),
+            )
+            self._db.commit()
+
+    async def fetch_live(self, class_name: str, language: str = "English") -> dict:
+        """
+        Ask the live LLM and keep the answer if it validates. Only known
+        LANGUAGES are stored; answers for any other client-supplied language
+        are served but not persisted, so they cannot grow the store.
+        """
+        info = await llm_disease_info(class_name, language)
+        if language in LANGUAGES and validate_disease_info(info):
+            self.put(class_name, language, info, source="live")
+        return info
+
+    async def get_disease_info(self, class_name: str, language: str = "English") -> dict:
+        """
+        Drop-in replacement for llm.get_disease_info: serve from the store and
+        fall back to the live LLM on a miss.
+        """
+        info = self.get(class_name, language)
+        if info is None:
+            info = await self.fetch_live(class_name, language)
+        return info
+
+
+async def build(knowledge_base, class_names, languages, force=False, retries=2, concurrency=4):
+    """Generate and validate disease info for every (class, language) pair."""
+    pairs = [(c, lang) for c in class_names for lang in languages
+             if force or (c, lang) not in knowledge_base]
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = []
+
+    async def generate(n, class_name, language):
+        async with semaphore:
+            for _ in range(retries + 1):
+                try:
+                    info = await llm_disease_info(class_name, language)
+                except Exception as e:
+                    print(f"[{n}/{len(pairs)}] {class_name} ({language}): {e}")
+                    info = None
+                if validate_disease_info(info):
+                    knowledge_base.put(class_name, language, info)
+                    print(f"[{n}/{len(pairs)}] {class_name} ({language}) ✓")
+                    return
+            failed.append((class_name, language))
+            print(f"[{n}/{len(pairs)}] {class_name} ({language}) failed validation")
+
+    try:
+        await asyncio.gather(*(generate(n, c, lang) for n, (c, lang) in enumerate(pairs, 1)))
+    finally:
+        await close_client()
+
+    print(f"Knowledge base has {len(knowledge_base)} entries, {len(failed)} failed")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the disease information knowledge base")
+    parser.add_argument("command", choices=["build", "stats"])
+    parser.add_argument("--db", default=KNOWLEDGE_DB)
+    parser.add_argument("--class-mapping", default=None, help="class_mapping.pth written by model.py")
+    parser.add_argument("--languages", nargs="+", default=LANGUAGES)
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that already exist")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel LLM requests")
+    args = parser.parse_args()
+
+    kb = KnowledgeBase(args.db)
+    if args.command == "stats":
+        languages = sorted({lang for _, lang in kb.keys()})
+        classes = sorted({c for c, _ in kb.keys()})
+        print(f"{len(kb)} entries — {len(classes)} classes × {len(languages)} languages ({', '.join(languages)})")
+    else:
+        from predict import load_class_names, CLASS_MAPPING_PATH
+        class_names = load_class_names(args.class_mapping or CLASS_MAPPING_PATH)
+        failed = asyncio.run(build(kb, class_names, args.languages, force=args.force, concurrency=args.concurrency))
+        raise SystemExit(1 if failed else 0)
@@ -1,51 +1,409 @@
 """
 Croply AI — LLM Integration Module
 Handles all Groq Llama3 API interactions for disease info, chat, and care tips.
+Requests go through one shared asyncio client with a keep-alive connection
+pool (HTTP/2 when the `h2` package is installed), so they never block the
+event loop or pay for a fresh TLS handshake.
+
+Every call is admitted by `scheduler`, which keeps us inside the Groq quota
+(requests and tokens per minute), serves disease info ahead of care tips
+and chat, retries 429/5xx with jittered backoff and sheds load when a
+priority's queue is full or its calls would wait longer than allowed.
 """
 
 import os
 import json
-import requests
-from typing import Union
+import time
+import random
+import asyncio
+import httpx
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional, Union
 from dotenv import load_dotenv
 
+from metrics import (LLM_REQUEST_SECONDS, LLM_IN_FLIGHT, LLM_QUEUE_SECONDS, LLM_RETRIES, LLM_SHED,
+                     Callback)
+
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama-3.1-8b-instant"
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+
+# Prompt budget for past chat turns; older turns are dropped (or, for
+# server-side conversations, rolled into a summary) rather than counted
+HISTORY_TOKEN_BUDGET = int(os.getenv("CROPLY_CHAT_HISTORY_TOKENS", "1500"))
+
+# Scheduler — defaults match the Groq free tier for llama-3.1-8b-instant
+# (30 requests and 6000 tokens per minute); 0 disables a limit. The quota is
+# per process: serve.py splits it between its workers.
+LLM_RPM = float(os.getenv("CROPLY_LLM_RPM", "30"))
+LLM_TPM = float(os.getenv("CROPLY_LLM_TPM", "6000"))
+LLM_CONCURRENCY = int(os.getenv("CROPLY_LLM_CONCURRENCY", str(GROQ_MAX_CONNECTIONS)))
+LLM_QUEUE_DEPTH = int(os.getenv("CROPLY_LLM_QUEUE_DEPTH", "64"))
+LLM_MAX_RETRIES = int(os.getenv("CROPLY_LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF = float(os.getenv("CROPLY_LLM_BACKOFF", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("CROPLY_LLM_BACKOFF_MAX", "20"))
+
+# Lower runs first. /predict depends on disease info, so chat can never starve it.
+PRIORITIES = {"disease_info": 0, "care_tips": 1, "chat": 2, "background": 3}
+
+# Longest a call may wait for admission before it is refused (seconds, 0 =
+# no limit). Kept under typical client and proxy timeouts, so nobody is
+# charged quota for an answer whose client has already given up. Override
+# one kind with e.g. CROPLY_LLM_MAX_QUEUE_WAIT_CHAT; background work has no client.
+LLM_MAX_QUEUE_WAIT = float(os.getenv("CROPLY_LLM_MAX_QUEUE_WAIT", "20"))
+MAX_QUEUE_WAIT = {
+    kind: float(os.getenv(f"CROPLY_LLM_MAX_QUEUE_WAIT_{kind.upper()}",
+                          "0" if kind == "background" else str(LLM_MAX_QUEUE_WAIT)))
+    for kind in PRIORITIES
+}
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled client, created lazily inside the running event loop."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(GROQ_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the pooled client (called on API shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Llama token count (~4 characters per token plus per-message overhead)."""
+    return len(text) // 4 + 4
 
 
-def _call_groq(system_prompt: str, user_prompt: str, temperature: float = 0.3,
-               max_tokens: int = 800, json_mode: bool = False,
-               history: list = None) -> Union[dict, str]:
+def trim_history(history: list, budget: int = HISTORY_TOKEN_BUDGET) -> list:
+    """The newest user/assistant turns that fit in `budget` tokens, oldest first."""
+    kept, used = [], 0
+    for msg in reversed(history):
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if role not in ("user", "assistant") or not content:
+            continue
+        used += estimate_tokens(content)
+        if used > budget:
+            break
+        kept.append({"role": role, "content": content})
+    kept.reverse()
+    return kept
+
+
+def _build_messages(system_prompt: str, user_prompt: str, history: list = None, summary: str = None) -> list:
+    """System prompt, optional summary and past turns, then the new user message."""
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    if history:
+        # Past conversation turns, newest first until the token budget is spent
+        messages.extend(trim_history(history))
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+class LLMOverloaded(RuntimeError):
+    """Raised instead of queueing (or waiting on) a call the scheduler can't admit in time."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
     """
-    Internal helper — sends a chat completion request to the Groq API.
-    Returns parsed JSON dict or raw string.
-    Optionally accepts conversation history for context-aware chat.
+    Refills at `per_minute / 60` units per second up to one minute's worth,
+    matching how per-minute API quotas are enforced. `per_minute` 0 = unlimited.
+    """
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def backlog_delay(self, amounts, now: float) -> float:
+        """
+        Seconds until the last of `amounts`, taken one after another, can be
+        taken. Each is capped at the capacity exactly as `delay` and `take`
+        cap it, so a single amount gives the same answer as `delay`.
+        """
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        total = sum(min(amount, self.capacity) for amount in amounts)
+        return max(0.0, (total - self.level) * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        if self.per_minute > 0:
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        if self.per_minute > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the Groq API.
+
+    Callers wait in one FIFO per priority (see PRIORITIES). The head of the
+    most urgent non-empty queue is admitted once a concurrency slot is free,
+    the request and token buckets can cover it and no upstream Retry-After
+    pause is in force; nothing of lower priority overtakes it.
+
+    A caller gets LLMOverloaded at once if its queue is already `queue_depth`
+    long or its estimated wait exceeds the kind's `max_queue_wait`, and after
+    `max_queue_wait` if it still hasn't been admitted. Either way it leaves
+    without taking any quota.
+    """
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, concurrency: int = LLM_CONCURRENCY,
+                 queue_depth: int = LLM_QUEUE_DEPTH, max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_BACKOFF, backoff_max: float = LLM_BACKOFF_MAX,
+                 max_queue_wait: Optional[dict] = None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = max(1, concurrency)
+        self.queue_depth = queue_depth
+        self.max_queue_wait = dict(MAX_QUEUE_WAIT, **(max_queue_wait or {}))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.retries = 0
+        self.shed = 0
+        self._queues = {p: deque() for p in sorted(set(PRIORITIES.values()))}
+        self._timer = None
+
+    def scale(self, fraction: float) -> None:
+        """Keep only `fraction` of the quota (for one of several worker processes)."""
+        for bucket in (self.requests, self.tokens):
+            bucket.per_minute *= fraction
+            bucket.capacity *= fraction
+            bucket.level = min(bucket.level, bucket.capacity)
+
+    def queue_lengths(self) -> dict:
+        return {kind: sum(1 for e in self._queues[p] if not e[0].done()) for kind, p in PRIORITIES.items()}
+
+    def estimated_wait(self, priority: int, cost: int) -> float:
+        """
+        Rough seconds until a call of `cost` tokens joining the `priority`
+        queue now would be admitted: everything queued at that priority or
+        above goes first, and both the request and token buckets must cover it.
+        """
+        now = time.monotonic()
+        costs = [e[1] for p, queue in self._queues.items() if p <= priority for e in queue if not e[0].done()]
+        costs.append(cost)
+        return max(self.paused_until - now, self.requests.backlog_delay([1] * len(costs), now),
+                   self.tokens.backlog_delay(costs, now), 0.0)
+
+    @asynccontextmanager
+    async def slot(self, kind: str, cost: int):
+        """Hold one admitted request of `kind` estimated at `cost` tokens."""
+        priority = PRIORITIES[kind]
+        queue = self._queues[priority]
+        max_wait = self.max_queue_wait.get(kind, 0)
+        name = kind.replace('_', ' ')
+        if self.queue_depth and len(queue) >= self.queue_depth:
+            self._shed(kind, cost, f"Too many queued {name} requests")
+        if max_wait and self.estimated_wait(priority, cost) > max_wait:
+            self._shed(kind, cost, f"{name.capitalize()} requests are queued beyond {max_wait:g}s")
+
+        entry = (asyncio.get_running_loop().create_future(), cost)
+        queue.append(entry)
+        queued_at = time.perf_counter()
+        self._dispatch()
+        try:
+            # asyncio.wait leaves the future alone on timeout or cancellation
+            await asyncio.wait([entry[0]], timeout=max_wait or None)
+        except asyncio.CancelledError:
+            self._abandon(queue, entry)
+            raise
+        if not entry[0].done():
+            # Not admitted in time: leave the queue before any quota is taken
+            self._abandon(queue, entry)
+            self._shed(kind, cost, f"Timed out waiting to send {name} request")
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - queued_at, kind)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every queue for `seconds` (upstream said Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self._dispatch()
+
+    def refund(self, tokens: float) -> None:
+        """Return reserved tokens a finished request didn't use."""
+        if tokens > 0:
+            self.tokens.refund(tokens)
+            self._dispatch()
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Upstream's Retry-After if given, else full-jitter exponential backoff."""
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _abandon(self, queue, entry) -> None:
+        future = entry[0]
+        if future.done() and not future.cancelled():
+            # Admitted just as the caller gave up
+            self._release()
+            return
+        future.cancel()
+        try:
+            queue.remove(entry)
+        except ValueError:
+            pass
+
+    def _shed(self, kind: str, cost: int, message: str) -> None:
+        self.shed += 1
+        LLM_SHED.inc(kind)
+        raise LLMOverloaded(message, max(1.0, self.estimated_wait(PRIORITIES[kind], cost)))
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        for queue in self._queues.values():
+            while queue:
+                future, cost = queue[0]
+                if future.done():
+                    # Cancelled while waiting
+                    queue.popleft()
+                    continue
+                if self.in_flight >= self.concurrency:
+                    return
+                wait = max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(cost, now))
+                if wait > 0:
+                    self._timer = future.get_loop().call_later(wait, self._dispatch)
+                    return
+                queue.popleft()
+                self.requests.take(1)
+                self.tokens.take(cost)
+                self.in_flight += 1
+                future.set_result(None)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if any."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_cost(messages: list, max_tokens: int) -> int:
+    """Tokens reserved against the TPM quota: the prompt plus the most the reply may use."""
+    return sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+
+
+async def _before_retry(kind: str, attempt: int, reason: str, retry_after: Optional[float] = None) -> bool:
     """
+    Sleep before retry number `attempt` + 1, or return False if the budget
+    is spent or upstream asks us to wait longer than LLM_BACKOFF_MAX.
+    A 429 with Retry-After pauses every queue for that long either way.
+    """
+    if reason == "429" and retry_after is not None:
+        # Rate limited: hold every queue, not just this caller, even if it gives up
+        scheduler.pause(retry_after)
+    if attempt >= scheduler.max_retries or (retry_after is not None and retry_after > scheduler.backoff_max):
+        return False
+    scheduler.retries += 1
+    LLM_RETRIES.inc(kind, reason)
+    delay = scheduler.backoff_delay(attempt, retry_after)
+    if reason == "429" and retry_after is None:
+        scheduler.pause(delay)
+    await asyncio.sleep(delay)
+    return True
+
+
+# Shared scheduler used by every call below
+scheduler = LLMScheduler()
+
+Callback("croply_llm_queue_length", "LLM requests waiting for the scheduler", "gauge",
+         lambda: {(kind,): n for kind, n in scheduler.queue_lengths().items()}, ("kind",))
+
+
+def _headers() -> dict:
     if not GROQ_API_KEY:
         raise RuntimeError("GROQ_API_KEY not set in environment variables")
-
-    headers = {
+    return {
         "Authorization": f"Bearer {GROQ_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    # Build messages list
-    messages = [{"role": "system", "content": system_prompt}]
-    if history:
-        # Append past conversation turns (limit to last 20 for token safety)
-        for msg in history[-20:]:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role in ("user", "assistant") and content:
-                messages.append({"role": role, "content": content})
-    messages.append({"role": "user", "content": user_prompt})
+
+async def _call_groq(system_prompt: str, user_prompt: str, temperature: float = 0.3,
+                     max_tokens: int = 800, json_mode: bool = False,
+                     history: list = None, timeout: float = None, summary: str = None,
+                     kind: str = "chat") -> Union[dict, str]:
+    """
+    Internal helper — sends a chat completion request to the Groq API.
+    Returns parsed JSON dict or raw string.
+    Optionally accepts conversation history for context-aware chat.
+    `kind` picks the scheduler priority (see PRIORITIES).
+    """
+    headers = _headers()
 
     payload = {
         "model": GROQ_MODEL,
-        "messages": messages,
+        "messages": _build_messages(system_prompt, user_prompt, history, summary),
         "temperature": temperature,
         "max_tokens": max_tokens,
     }
@@ -53,10 +411,41 @@ def _call_groq(system_prompt: str, user_prompt: str, temperature: float = 0.3,
     if json_mode:
         payload["response_format"] = {"type": "json_object"}
 
-    response = requests.post(GROQ_API_URL, headers=headers, json=payload)
-    response.raise_for_status()
+    mode = "json" if json_mode else "text"
+    cost = _request_cost(payload["messages"], max_tokens)
+    attempt = 0
+    while True:
+        outcome = "error"
+        try:
+            async with scheduler.slot(kind, cost):
+                started = time.perf_counter()
+                try:
+                    with LLM_IN_FLIGHT.track():
+                        response = await get_client().post(
+                            GROQ_API_URL, headers=headers, json=payload,
+                            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                        )
+                    outcome = str(response.status_code)
+                finally:
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode, outcome)
+        except httpx.TransportError:
+            if await _before_retry(kind, attempt, "transport"):
+                attempt += 1
+                continue
+            raise
 
-    content = response.json()["choices"][0]["message"]["content"]
+        if response.status_code in RETRYABLE_STATUS and await _before_retry(
+                kind, attempt, outcome, _retry_after(response)):
+            attempt += 1
+            continue
+        response.raise_for_status()
+        break
+
+    body = response.json()
+    used = body.get("usage", {}).get("total_tokens")
+    if used is not None:
+        scheduler.refund(cost - used)
+    content = body["choices"][0]["message"]["content"]
 
     if json_mode:
         try:
@@ -67,7 +456,72 @@ def _call_groq(system_prompt: str, user_prompt: str, temperature: float = 0.3,
     return content
 
 
-def get_disease_info(disease_name: str, language: str = "English") -> dict:
+async def _stream_groq(system_prompt: str, user_prompt: str, temperature: float = 0.3,
+                       max_tokens: int = 800, history: list = None,
+                       timeout: float = None, summary: str = None,
+                       kind: str = "chat") -> AsyncIterator[str]:
+    """
+    Streaming variant of `_call_groq` — yields content deltas as the
+    upstream server-sent events arrive instead of buffering the full reply.
+    Failures are only retried before the first delta has been yielded.
+    """
+    headers = _headers()
+
+    payload = {
+        "model": GROQ_MODEL,
+        "messages": _build_messages(system_prompt, user_prompt, history, summary),
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True,
+    }
+
+    cost = _request_cost(payload["messages"], max_tokens)
+    attempt = 0
+    while True:
+        retry, retry_after, reason = False, None, "transport"
+        async with scheduler.slot(kind, cost):
+            outcome = "error"
+            started = time.perf_counter()
+            yielded = False
+            LLM_IN_FLIGHT.inc()
+            try:
+                async with get_client().stream(
+                    "POST", GROQ_API_URL, headers=headers, json=payload,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                ) as response:
+                    outcome = reason = str(response.status_code)
+                    if response.status_code in RETRYABLE_STATUS:
+                        retry, retry_after = True, _retry_after(response)
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            if delta:
+                                yielded = True
+                                yield delta
+            except httpx.TransportError:
+                if yielded:
+                    raise
+                retry = True
+            finally:
+                LLM_IN_FLIGHT.dec()
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, "stream", outcome)
+
+        if not retry:
+            return
+        if not await _before_retry(kind, attempt, reason, retry_after):
+            if reason == "transport":
+                raise httpx.TransportError("Groq stream failed after retries")
+            raise httpx.HTTPStatusError(f"Groq returned {reason}", request=response.request, response=response)
+        attempt += 1
+
+
+async def get_disease_info(disease_name: str, language: str = "English") -> dict:
     """
     Given a disease class name (e.g. 'Tomato___Late_blight'), return structured
     disease information including description, symptoms, causes, treatments, and prevention.
@@ -95,16 +549,12 @@ def get_disease_info(disease_name: str, language: str = "English") -> dict:
 
 Focus on practical, scientifically accurate information."""
 
-    return _call_groq(system_prompt, user_prompt, temperature=0.3, max_tokens=800, json_mode=True)
+    return await _call_groq(system_prompt, user_prompt, temperature=0.3, max_tokens=800, json_mode=True,
+                            kind="disease_info")
 
 
-def chat_response(message: str, language: str = "English", history: list = None) -> str:
-    """
-    General-purpose AI chatbot with conversation memory.
-    Handles plant health questions AND general knowledge.
-    Accepts optional history list of {role, content} dicts for context.
-    """
-    system_prompt = (
+def _chat_system_prompt(language: str) -> str:
+    return (
         "You are Croply AI, a friendly and knowledgeable assistant. "
         "Your primary expertise is in plant pathology, agriculture, and plant care — "
         "but you can also answer general knowledge questions, help with everyday queries, "
@@ -115,14 +565,43 @@ def chat_response(message: str, language: str = "English", history: list = None)
         f"Respond in {language}."
     )
 
-    return _call_groq(system_prompt, message, temperature=0.4, max_tokens=1000, history=history)
+
+async def chat_response(message: str, language: str = "English", history: list = None, summary: str = None) -> str:
+    """
+    General-purpose AI chatbot with conversation memory.
+    Handles plant health questions AND general knowledge.
+    Accepts optional history list of {role, content} dicts for context, and
+    a summary of turns older than that history.
+    """
+    return await _call_groq(_chat_system_prompt(language), message, temperature=0.4, max_tokens=1000,
+                            history=history, summary=summary)
+
+
+def stream_chat_response(message: str, language: str = "English", history: list = None,
+                         summary: str = None) -> AsyncIterator[str]:
+    """Same as `chat_response`, but yields the reply token by token."""
+    return _stream_groq(_chat_system_prompt(language), message, temperature=0.4, max_tokens=1000,
+                        history=history, summary=summary)
 
 
-def get_care_tips(plant_name: str, language: str = "English") -> str:
+async def summarize_conversation(messages: list, previous_summary: str = None, language: str = "English") -> str:
     """
-    Generate a care routine for a given plant covering watering, sunlight,
-    soil, pests, and seasonal tips.
+    Fold older chat turns (and the summary they extend) into one short
+    summary that keeps the facts later answers may depend on.
     """
+    system_prompt = (
+        "You summarize conversations between a user and Croply AI, a plant health assistant. "
+        "Keep plants, diseases, symptoms, treatments, user circumstances and open questions; "
+        f"drop pleasantries. At most 150 words. Write in {language}."
+    )
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    user_prompt = f"Conversation to add to the summary:\n{transcript}"
+    if previous_summary:
+        user_prompt = f"Existing summary: {previous_summary}\n\n{user_prompt}"
+    return await _call_groq(system_prompt, user_prompt, temperature=0.2, max_tokens=300, kind="background")
+
+
+def _care_tips_prompts(plant_name: str, language: str) -> tuple:
     system_prompt = "You are Croply AI, an expert plant care advisor. Provide practical, concise care routines."
 
     user_prompt = f"""Provide a concise daily/weekly care routine for {plant_name} plants, covering:
@@ -134,4 +613,19 @@ def get_care_tips(plant_name: str, language: str = "English") -> str:
 
 Keep it practical and actionable for home gardeners. Respond in {language}."""
 
-    return _call_groq(system_prompt, user_prompt, temperature=0.3, max_tokens=800)
+    return system_prompt, user_prompt
+
+
+async def get_care_tips(plant_name: str, language: str = "English") -> str:
+    """
+    Generate a care routine for a given plant covering watering, sunlight,
+    soil, pests, and seasonal tips.
+    """
+    system_prompt, user_prompt = _care_tips_prompts(plant_name, language)
+    return await _call_groq(system_prompt, user_prompt, temperature=0.3, max_tokens=800, kind="care_tips")
+
+
+def stream_care_tips(plant_name: str, language: str = "English") -> AsyncIterator[str]:
+    """Same as `get_care_tips`, but yields the routine token by token."""
+    system_prompt, user_prompt = _care_tips_prompts(plant_name, language)
+    return _stream_groq(system_prompt, user_prompt, temperature=0.3, max_tokens=800, kind="care_tips")
@@ -1,37 +1,218 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
+from contextlib import asynccontextmanager
 import uvicorn
-import tempfile
+import asyncio
+import json
+import math
 import os
-import imghdr
+import time
+import threading
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
 from dotenv import load_dotenv
 
-# Internal imports
-from predict import predict_leaf_disease
-from llm import get_disease_info, chat_response, get_care_tips
-
-# Load environment variables
+# Load environment variables before the internal modules read their config
 load_dotenv()
 
+# Internal imports. The vision modules (ingest, preprocessing, predict,
+# inference, cache) pull in torch, torchvision, OpenCV and PIL, so they are
+# imported on first use instead — see _load_vision.
+from llm import chat_response, get_care_tips, stream_chat_response, stream_care_tips, close_client, LLMOverloaded
+from knowledge import KnowledgeBase
+from conversations import ConversationStore
+from enrichment import EnrichmentJobs, ENRICHMENT_MODE, ENRICHMENT_MODES
+import metrics
+from metrics import STAGE_SECONDS, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT, GATE_REJECTIONS
+
+
+# ── Vision Stack & Warmup ───────────────────────────────────────────────────
+# Dummy forward passes per batch size at startup (0 = just load the weights)
+WARMUP_RUNS = int(os.getenv("CROPLY_WARMUP_RUNS", "3"))
+
+# State of the image path, reported by GET /ready
+model_state = {"status": "starting", "error": None, "load_seconds": None, "warmup_seconds": None}
+
+prediction_cache = None
+_vision_lock = threading.Lock()
+
+
+def _load_vision():
+    """
+    Import the torch / OpenCV side of the API and build the prediction cache.
+    Idempotent; called from a worker thread by the warmup or the first upload.
+    """
+    global prediction_cache
+    if prediction_cache is None:
+        with _vision_lock:
+            if prediction_cache is None:
+                from predict import registry, cascade
+                from cache import PredictionCache, file_fingerprint
+                import inference  # noqa: F401  (registers its metrics)
+
+                # Results are namespaced by the model files' path, size and mtime, so
+                # swapping or retraining the weights in place never serves stale hits
+                namespace = f"{file_fingerprint(registry.model_path)}|{file_fingerprint(registry.mapping_path)}"
+                if cascade is not None:
+                    namespace += f"+{file_fingerprint(cascade.student.model_path)}@{cascade.threshold:g}"
+                prediction_cache = PredictionCache(namespace=namespace)
+    return prediction_cache
+
+
+def _warm_up():
+    """
+    Load the classifier and run WARMUP_RUNS dummy batches (single image and a
+    full engine batch) so the first real /predict pays for neither lazy
+    initialisation nor first-call allocator and kernel setup.
+    """
+    model_state["status"] = "loading"
+    started = time.perf_counter()
+    try:
+        _load_vision()
+        import torch
+        from predict import registry, cascade, classify_batch
+        from preprocessing import INPUT_SIZE
+        from inference import engine
+
+        (cascade or registry).load()
+        model_state["load_seconds"] = time.perf_counter() - started
+        engine.start()
+
+        model_state["status"] = "warming_up"
+        warm_started = time.perf_counter()
+        for model_registry in ((cascade.student, registry) if cascade else (registry,)):
+            for batch_size in sorted({1, engine.max_batch_size}):
+                dummy = torch.zeros(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+                for _ in range(WARMUP_RUNS):
+                    classify_batch(dummy, model_registry)
+        model_state["warmup_seconds"] = time.perf_counter() - warm_started
+        model_state["status"] = "ready"
+        print(f"Classifier ready in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        # Keep the LLM endpoints up even if torch or the weights are missing
+        model_state["status"] = "failed"
+        model_state["error"] = str(e)
+        print(f"Warning: could not load model at startup: {e}")
+
+
+async def _ensure_vision():
+    """The prediction cache, importing the vision stack off the event loop if needed."""
+    return prediction_cache or await run_in_threadpool(_load_vision)
+
+
+# ── Lifespan ────────────────────────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm the classifier up in the background: /chat and /care-tips serve
+    immediately, and GET /ready reports when /predict is ready as well.
+    """
+    app.state.warmup = asyncio.ensure_future(run_in_threadpool(_warm_up))
+    yield
+    await app.state.warmup
+    if prediction_cache is not None:
+        from inference import engine
+        engine.stop()
+    await close_client()
+
+
+# ── Upload Limits ───────────────────────────────────────────────────────────
+# Same setting as ingest.MAX_UPLOAD_BYTES, read here so the check below runs
+# without importing the vision stack
+MAX_UPLOAD_BYTES = int(float(os.getenv("CROPLY_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+MAX_BATCH_FILES = int(os.getenv("CROPLY_MAX_BATCH_FILES", "64"))
+# Multipart boundaries, part headers and the small form fields
+_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimit:
+    """
+    Refuses oversized upload bodies before the multipart form is parsed, so
+    they are neither fully received nor spooled to disk: at once from
+    Content-Length, or, for chunked bodies, as soon as the running total
+    passes the route's limit. The per-file check in _classify_upload stays.
+    """
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": _too_large(limit)})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=_too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _too_large(limit: int) -> str:
+    return f"Request too large. Maximum size is {limit // (1024 * 1024)} MB."
+
+
 # ── FastAPI App ──────────────────────────────────────────────────────────────
 app = FastAPI(
     title="Croply AI — Plant Health Platform",
     description="AI-Powered Plant Disease Detection, Chat Assistant, and Care Tips API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Added first so CORS (added after, so outside it) still decorates its 413s
+app.add_middleware(UploadSizeLimit, limits={
+    "/predict": MAX_UPLOAD_BYTES + _FORM_OVERHEAD,
+    "/predict/batch": MAX_BATCH_FILES * MAX_UPLOAD_BYTES + _FORM_OVERHEAD,
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Conversation-Id"],
 )
 
 
+def _route_path(request: Request) -> str:
+    """Route template for metric labels, so unknown paths can't add series."""
+    for route in app.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            return route.path
+    return "other"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    path = _route_path(request)
+    status = "500"
+    started = time.perf_counter()
+    try:
+        with HTTP_IN_FLIGHT.track(path):
+            response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, path, request.method, status)
+
+
 # ── Pydantic Models ─────────────────────────────────────────────────────────
 class ChatMessage(BaseModel):
     role: str
@@ -40,6 +221,9 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     language: str = "English"
+    # Server-side session; omit to start one. With `history`, the session is
+    # (re)seeded from it; `history` alone is the old stateless mode.
+    conversation_id: Optional[str] = Field(None, max_length=64)
     history: Optional[List[ChatMessage]] = None
 
 class CareTipsRequest(BaseModel):
@@ -55,86 +239,442 @@ async def root():
     return {
         "app": "Croply AI",
         "version": "1.0.0",
-        "endpoints": ["/predict", "/chat", "/care-tips"],
+        "endpoints": ["/ready", "/predict", "/predict/{job_id}/info", "/predict/batch", "/chat", "/chat/stream", "/chat/{conversation_id}", "/care-tips", "/care-tips/stream", "/metrics"],
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the classifier is loaded and warmed up, 503
+    while it is still starting (or if it failed to load). `/` stays the
+    liveness check — the LLM endpoints work in either state.
+    """
+    is_ready = model_state["status"] == "ready"
+    return JSONResponse(content={"ready": is_ready, **model_state}, status_code=200 if is_ready else 503)
+
+
+# ── Prediction Helpers ──────────────────────────────────────────────────────
+# Precomputed disease info (build with `python knowledge.py build`)
+knowledge_base = KnowledgeBase()
+
+# Cache effectiveness, read from the caches' own counters at scrape time
+# (the prediction cache series appear once the vision stack is loaded)
+metrics.Callback("croply_prediction_cache_lookups_total", "Prediction cache lookups by result", "counter",
+                 lambda: {("hit",): prediction_cache.hits, ("miss",): prediction_cache.misses},
+                 ("result",))
+metrics.Callback("croply_prediction_cache_disk_hits_total", "Prediction cache hits served from SQLite", "counter",
+                 lambda: prediction_cache.disk_hits)
+metrics.Callback("croply_knowledge_lookups_total", "Disease info lookups in the knowledge base by result", "counter",
+                 lambda: {("hit",): knowledge_base.hits, ("miss",): knowledge_base.misses},
+                 ("result",))
+metrics.Callback("croply_model_loaded", "1 once the classifier is loaded and warmed up", "gauge",
+                 lambda: int(model_state["status"] == "ready"))
+
+
+async def _classify_upload(file: UploadFile) -> tuple:
+    """
+    Read, validate and classify one uploaded image entirely in memory.
+    Returns (image_type, prediction); raises HTTPException on bad input.
+    Images the leaf gate rejects come back with confidence 0 and `rejected_by`.
+    """
+    prediction_cache = await _ensure_vision()
+    from ingest import MAX_UPLOAD_BYTES, detect_image_type, decode_image
+    from preprocessing import preprocess_image, leaf_gate, GATE_ENABLED
+    from cache import content_key
+    from inference import engine
+
+    with STAGE_SECONDS.time("upload_read"):
+        content = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+
+    img_type = detect_image_type(content)
+    if img_type is None:
+        raise HTTPException(status_code=400, detail="Invalid image file. Upload JPG or PNG.")
+
+    # Identical bytes → skip decoding and inference entirely
+    exact_key = content_key(content)
+    prediction = await run_in_threadpool(prediction_cache.get, exact_key, not prediction_cache.perceptual)
+    if prediction is not None:
+        return img_type, prediction
+
+    # Decode at reduced resolution off the event loop
+    try:
+        with STAGE_SECONDS.time("decode"):
+            image = await run_in_threadpool(decode_image, content)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image file. Upload JPG or PNG.")
+
+    # Re-encoded copy of a photo we've already seen → skip inference
+    if prediction_cache.perceptual:
+        prediction = await run_in_threadpool(prediction_cache.get_similar, image)
+        if prediction is not None:
+            await run_in_threadpool(prediction_cache.put, exact_key, value=prediction)
+            return img_type, prediction
+
+    # Obvious non-leaves (blank frames, screenshots, selfies) never reach the model
+    if GATE_ENABLED:
+        with STAGE_SECONDS.time("gate"):
+            verdict = await run_in_threadpool(leaf_gate, image)
+        if not verdict.passed:
+            GATE_REJECTIONS.inc(verdict.reason)
+            return img_type, {"category": None, "confidence": 0.0, "rejected_by": verdict.reason}
+
+    # Preprocess off the event loop, then batch with concurrent requests
+    with STAGE_SECONDS.time("preprocess"):
+        img_tensor = await run_in_threadpool(preprocess_image, image)
+    # Queue wait + batched forward pass (also recorded separately by the engine)
+    with STAGE_SECONDS.time("inference"):
+        prediction = await engine.predict(img_tensor)
+    await run_in_threadpool(prediction_cache.put, exact_key, value=prediction, image=image)
+    return img_type, prediction
+
+
+async def _fetch_disease_info(category: str, language: str) -> dict:
+    """
+    Disease info from the precomputed knowledge base, falling back to the
+    live LLM on a miss.
+    """
+    disease_info = knowledge_base.get(category, language)
+    if disease_info is not None:
+        return disease_info
+    return await _live_disease_info(category, language)
+
+
+async def _fetch_live_disease_info(category: str, language: str) -> dict:
+    """Disease info from the LLM. Raises (e.g. LLMOverloaded) when it can't be had."""
+    with STAGE_SECONDS.time("disease_info_llm"):
+        return await knowledge_base.fetch_live(category, language)
+
+
+async def _live_disease_info(category: str, language: str) -> dict:
+    """
+    Disease info from the LLM for responses that wait for it. Degrades to a
+    placeholder when the API is unavailable; enrichment jobs use
+    _fetch_live_disease_info instead, so their clients see `failed` and retry.
+    """
+    try:
+        return await _fetch_live_disease_info(category, language)
+    except Exception:
+        return {"raw_content": "Could not fetch disease info. Check GROQ_API_KEY."}
+
+
+def _info_line(job_id: str, result: dict) -> dict:
+    """The info part of a poll or stream response, with retry_after on a retryable failure."""
+    line = {"info_job_id": job_id, "info_status": result["status"],
+            "disease_information": result["disease_information"]}
+    if result.get("retry_after") is not None:
+        line["retry_after"] = math.ceil(result["retry_after"])
+    return line
+
+
+def _prediction_payload(filename: str, img_type: str, prediction: dict, disease_info: Optional[dict]) -> dict:
+    """Build the /predict response body for one classified image."""
+    from predict import CONFIDENCE_THRESHOLD
+
+    payload = {
+        "filename": filename,
+        "image_type": img_type,
+        "is_valid_leaf": prediction["confidence"] >= CONFIDENCE_THRESHOLD,
+        "prediction": {
+            "class": prediction["category"],
+            "confidence": prediction["confidence"],
+        },
+        "disease_information": disease_info,
     }
+    if "rejected_by" in prediction:
+        payload["rejection_reason"] = prediction["rejected_by"]
+    # Low confidence → likely not a valid / clear leaf image
+    if not payload["is_valid_leaf"]:
+        payload["message"] = "The uploaded image does not appear to be a clear leaf photo. Please upload a clear image of a plant leaf."
+        payload["disease_information"] = None
+    return payload
+
+
+# Disease info fetched after /predict has already answered
+enrichment_jobs = EnrichmentJobs()
+
+metrics.Callback("croply_enrichment_fetches_pending", "Background disease info fetches still running", "gauge",
+                 lambda: enrichment_jobs.pending)
+
+# Long polls are capped well below typical proxy idle timeouts
+MAX_INFO_WAIT = 25.0
 
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...), language: str = Form("English")):
+async def predict(file: UploadFile = File(...), language: str = Form("English"),
+                  enrichment: str = Form(ENRICHMENT_MODE)):
     """
     Upload a leaf image → get disease prediction + LLM-powered disease information.
+
+    `enrichment` picks how a disease info that isn't precomputed is delivered:
+    "inline" waits for it, "poll" answers at once with an `info_job_id` for
+    GET /predict/{job_id}/info, and "stream" answers with NDJSON — the
+    prediction line first, the disease info line once it is ready.
     """
-    # Read and validate image
-    content = await file.read()
+    if enrichment not in ENRICHMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"enrichment must be one of {', '.join(ENRICHMENT_MODES)}")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
+    img_type, prediction = await _classify_upload(file)
+    from predict import CONFIDENCE_THRESHOLD
+    category = prediction["category"]
+    wants_info = prediction["confidence"] >= CONFIDENCE_THRESHOLD
 
-    try:
-        img_type = imghdr.what(tmp_path)
-        if img_type is None:
-            raise HTTPException(status_code=400, detail="Invalid image file. Upload JPG or PNG.")
-
-        # Model prediction
-        prediction = predict_leaf_disease(tmp_path)
-
-        # Low confidence → likely not a valid / clear leaf image
-        CONFIDENCE_THRESHOLD = 40.0
-        if prediction["confidence"] < CONFIDENCE_THRESHOLD:
-            return JSONResponse(content={
-                "filename": file.filename,
-                "image_type": img_type,
-                "is_valid_leaf": False,
-                "message": "The uploaded image does not appear to be a clear leaf photo. Please upload a clear image of a plant leaf.",
-                "prediction": {
-                    "class": prediction["category"],
-                    "confidence": prediction["confidence"],
-                },
-                "disease_information": None,
+    # Knowledge-base hits are instant, so only live LLM lookups are deferred
+    disease_info = knowledge_base.get(category, language) if wants_info else None
+    if not wants_info or disease_info is not None or enrichment == "inline":
+        if wants_info and disease_info is None:
+            disease_info = await _live_disease_info(category, language)
+        return JSONResponse(content=_prediction_payload(file.filename, img_type, prediction, disease_info))
+
+    job_id = enrichment_jobs.start((category, language), lambda: _fetch_live_disease_info(category, language))
+    payload = _prediction_payload(file.filename, img_type, prediction, None)
+    payload["info_job_id"] = job_id
+    payload["info_status"] = "pending"
+    if enrichment == "poll":
+        return JSONResponse(content=payload)
+
+    task = enrichment_jobs.get(job_id)
+
+    async def stream():
+        yield json.dumps(payload) + "\n"
+        # asyncio.wait never cancels the task, so a client disconnecting can't cancel a fetch other jobs share
+        await asyncio.wait([task])
+        yield json.dumps(_info_line(job_id, enrichment_jobs.result(task))) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/predict/{job_id}/info")
+async def predict_info(job_id: str, wait: float = 0.0):
+    """
+    Disease info for a /predict call made with enrichment=poll. Pass `wait`
+    (seconds, max 25) to long-poll instead of polling in a loop.
+    """
+    result = await enrichment_jobs.wait(job_id, timeout=min(max(wait, 0.0), MAX_INFO_WAIT))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired enrichment job.")
+    content = _info_line(job_id, result)
+    headers = {"Retry-After": str(content["retry_after"])} if "retry_after" in content else None
+    return JSONResponse(content=content, headers=headers)
+
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...), language: str = Form("English")):
+    """
+    Upload many leaf images at once → one NDJSON line per image, streamed
+    as each finishes. All images share the micro-batching engine, and
+    disease info is fetched once per distinct predicted class.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files. Maximum is {MAX_BATCH_FILES} per request.")
+    await _ensure_vision()
+    from predict import CONFIDENCE_THRESHOLD
+
+    info_tasks = {}
+
+    def disease_info_for(category: str) -> asyncio.Task:
+        if category not in info_tasks:
+            info_tasks[category] = asyncio.ensure_future(_fetch_disease_info(category, language))
+        return info_tasks[category]
+
+    async def process(index: int, file: UploadFile) -> dict:
+        try:
+            img_type, prediction = await _classify_upload(file)
+        except HTTPException as e:
+            return {"index": index, "filename": file.filename, "error": e.detail}
+        except Exception as e:
+            # A failure on one image must not cut off the stream for the others
+            return {"index": index, "filename": file.filename, "error": f"Prediction error: {str(e)}"}
+
+        disease_info = None
+        if prediction["confidence"] >= CONFIDENCE_THRESHOLD:
+            disease_info = await disease_info_for(prediction["category"])
+        return {"index": index, **_prediction_payload(file.filename, img_type, prediction, disease_info)}
+
+    async def stream():
+        # All images are queued together so the engine stacks them into batches
+        tasks = [asyncio.ensure_future(process(i, f)) for i, f in enumerate(files)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            for task in tasks + list(info_tasks.values()):
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _overloaded(e: LLMOverloaded, error_prefix: str) -> HTTPException:
+    """503 with Retry-After when the LLM scheduler sheds a request instead of queueing it."""
+    return HTTPException(status_code=503, detail=f"{error_prefix}: {str(e)}",
+                         headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+# ── Chat Sessions ───────────────────────────────────────────────────────────
+conversations = ConversationStore()
+_summary_tasks = set()
+
+metrics.Callback("croply_chat_conversations", "Chat conversations held in memory", "gauge",
+                 lambda: len(conversations))
+
+
+def _chat_context(req: ChatRequest) -> tuple:
+    """
+    (conversation, history, summary) for a chat request. Clients that send
+    only their own `history` get the old stateless behaviour (conversation
+    None); everyone else gets the stored turns and rolling summary.
+
+    An unknown or expired `conversation_id` is a 409 with code
+    `unknown_conversation` rather than a silently empty conversation: the
+    client resends the same id with its local `history`, which seeds it.
+    """
+    if req.history and not req.conversation_id:
+        return None, [msg.model_dump() for msg in req.history], None
+    if req.history:
+        conversation = conversations.create(req.conversation_id, [msg.model_dump() for msg in req.history])
+    elif req.conversation_id:
+        conversation = conversations.get(req.conversation_id)
+        if conversation is None:
+            raise HTTPException(status_code=409, detail={
+                "code": "unknown_conversation",
+                "message": "Unknown or expired conversation. Resend it with its history.",
             })
+    else:
+        conversation = conversations.create()
+    history, summary = conversations.prompt_context(conversation)
+    return conversation, history, summary
+
+
+def _record_turn(conversation, req: ChatRequest, reply: str) -> None:
+    """Store a finished exchange and roll old turns into the summary if over budget."""
+    if conversation is None:
+        return
+    conversations.append(conversation, {"role": "user", "content": req.message},
+                         {"role": "assistant", "content": reply})
 
-        # LLM disease info
+    async def summarize():
         try:
-            disease_info = get_disease_info(prediction["category"], language)
-        except Exception:
-            disease_info = {"raw_content": "Could not fetch disease info. Check GROQ_API_KEY."}
-
-        return JSONResponse(content={
-            "filename": file.filename,
-            "image_type": img_type,
-            "is_valid_leaf": True,
-            "prediction": {
-                "class": prediction["category"],
-                "confidence": prediction["confidence"],
-            },
-            "disease_information": disease_info,
-        })
-    finally:
-        os.unlink(tmp_path)
+            await conversations.summarize(conversation, req.language)
+        except Exception as e:
+            # Unsummarized turns are still trimmed by the token budget
+            print(f"Warning: could not summarize conversation {conversation.id}: {e}")
+
+    task = asyncio.ensure_future(summarize())
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
 
 
 @app.post("/chat")
 async def chat(req: ChatRequest):
     """AI chat — ask any plant disease / care question."""
+    conversation, history, summary = _chat_context(req)
     try:
-        history_dicts = [msg.model_dump() for msg in req.history] if req.history else None
-        response = chat_response(req.message, req.language, history=history_dicts)
-        return JSONResponse(content={"response": response})
+        response = await chat_response(req.message, req.language, history=history, summary=summary)
+        _record_turn(conversation, req, response)
+        content = {"response": response}
+        if conversation is not None:
+            content["conversation_id"] = conversation.id
+        return JSONResponse(content=content)
+    except LLMOverloaded as e:
+        raise _overloaded(e, "Chat error")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+async def _sse_response(tokens, error_prefix: str, headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Relay an LLM token stream as Server-Sent Events. The first token is
+    awaited up front so upstream failures still surface as an HTTP 500.
+    """
+    try:
+        first = await tokens.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except LLMOverloaded as e:
+        await tokens.aclose()
+        raise _overloaded(e, error_prefix)
+    except Exception as e:
+        await tokens.aclose()
+        raise HTTPException(status_code=500, detail=f"{error_prefix}: {str(e)}")
+
+    async def events():
+        try:
+            if first is not None:
+                yield f"data: {json.dumps({'delta': first})}\n\n"
+            async for token in tokens:
+                yield f"data: {json.dumps({'delta': token})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'{error_prefix}: {str(e)}'})}\n\n"
+            return
+        finally:
+            await tokens.aclose()
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        **(headers or {}),
+    })
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    AI chat streamed as Server-Sent Events (`data: {"delta": ...}` per token).
+    The session id comes back in the `X-Conversation-Id` header.
+    """
+    conversation, history, summary = _chat_context(req)
+    tokens = stream_chat_response(req.message, req.language, history=history, summary=summary)
+    if conversation is None:
+        return await _sse_response(tokens, "Chat error")
+
+    async def recorded():
+        # Only a reply that streamed to the end is added to the conversation
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield token
+        finally:
+            await tokens.aclose()
+        _record_turn(conversation, req, "".join(parts))
+
+    return await _sse_response(recorded(), "Chat error", headers={"X-Conversation-Id": conversation.id})
+
+
+@app.delete("/chat/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    """Forget a server-side conversation (e.g. when the user clears the chat)."""
+    conversations.delete(conversation_id)
+    return Response(status_code=204)
+
+
 @app.post("/care-tips")
 async def care_tips_endpoint(req: CareTipsRequest):
     """Get AI-generated plant care routine."""
     try:
-        tips = get_care_tips(req.plant_name, req.language)
+        tips = await get_care_tips(req.plant_name, req.language)
         return JSONResponse(content={"tips": tips})
+    except LLMOverloaded as e:
+        raise _overloaded(e, "Care tips error")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Care tips error: {str(e)}")
 
 
+@app.post("/care-tips/stream")
+async def care_tips_stream(req: CareTipsRequest):
+    """Plant care routine streamed as Server-Sent Events."""
+    return await _sse_response(stream_care_tips(req.plant_name, req.language), "Care tips error")
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint: per-stage latency, in-flight requests, cache hits."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ── Run ──────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
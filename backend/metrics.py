@@ -0,0 +1,233 @@
+"""
+Croply AI — Runtime Metrics
+Minimal, dependency-free Prometheus instrumentation for the hot path:
+counters, gauges and fixed-bucket histograms guarded by one lock each, plus
+callback metrics read only at scrape time. Observing a value is a dict
+lookup, a bisect and two additions, so it stays on in production.
+
+main.py serves everything registered here on GET /metrics in the Prometheus
+text exposition format (version 0.0.4). Under serve.py that endpoint reaches
+whichever worker accepts the connection, so each worker also exposes its own
+metrics on a dedicated port via `serve_http`.
+"""
+
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from typing import Callable, Sequence
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds — from sub-millisecond decode stages up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by label values."""
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests currently in flight."""
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels):
+        """Increment for the duration of the block."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram of durations (or sizes) in the Prometheus layout."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall-clock duration of the block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Callback(_Metric):
+    """
+    Metric whose value is read from `func` at scrape time, for counts other
+    modules already keep (cache hits, queue depth). `func` returns a number,
+    or a {label_values_tuple: number} dict when `labelnames` is given.
+    """
+    def __init__(self, name: str, help: str, kind: str, func: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def render(self):
+        try:
+            values = self.func()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = self._header()
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_http(host: str, port: int) -> ThreadingHTTPServer:
+    """Serve `render()` on every GET to host:port from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    return server
+
+
+# ── Hot-path metrics shared by main.py, predict.py, inference.py and llm.py ──
+STAGE_SECONDS = Histogram(
+    "croply_stage_seconds", "Time spent in each stage of a prediction", ("stage",)
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "croply_http_request_seconds", "API request latency until the response starts", ("path", "method", "status")
+)
+HTTP_IN_FLIGHT = Gauge(
+    "croply_http_requests_in_flight", "API requests currently being handled", ("path",)
+)
+BATCH_SIZE = Histogram(
+    "croply_inference_batch_size", "Images per forward pass of the batching engine",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+GATE_REJECTIONS = Counter(
+    "croply_gate_rejections_total", "Uploads rejected by the leaf-validity gate before classification", ("reason",)
+)
+CASCADE_PREDICTIONS = Counter(
+    "croply_cascade_predictions_total", "Cascade-mode predictions by the model that produced them", ("model",)
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "croply_llm_request_seconds", "Groq API call latency (full reply, or whole stream)", ("mode", "outcome")
+)
+LLM_IN_FLIGHT = Gauge(
+    "croply_llm_requests_in_flight", "Groq API calls currently open"
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "croply_llm_queue_seconds", "Time a Groq call waited for the rate-limit scheduler", ("kind",)
+)
+LLM_RETRIES = Counter(
+    "croply_llm_retries_total", "Groq calls retried, by priority and cause (status code or transport)", ("kind", "reason")
+)
+LLM_SHED = Counter(
+    "croply_llm_shed_total", "Groq calls refused because their priority queue was full or they would wait too long", ("kind",)
+)
@@ -4,11 +4,21 @@ import numpy as np
 from PIL import Image
 import torch.nn as nn
 from torchvision import models, transforms
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import Dataset, DataLoader, random_split
+from torch.utils.data.distributed import DistributedSampler
 from torch.optim.lr_scheduler import ReduceLROnPlateau, CosineAnnealingLR
 import os
 import random
 
+from preprocessing import INPUT_SIZE, segment_leaf
+from shards import ShardDataset
+from augment import BatchAugment, ToUint8Tensor
+from predict import build_model, build_student, load_class_names, STUDENT_ARCHS
+from checkpoint import (AsyncCheckpointer, CHECKPOINT_DIR, KEEP_LAST, latest_checkpoint, load_checkpoint,
+                        rng_state, restore_rng_state)
+
 # Set seeds for reproducibility
 def set_seed(seed=42):
     random.seed(seed)
@@ -50,7 +60,7 @@ class LeafDataset(Dataset):
     def preprocess_image(self, image_path):
         """
         Apply grayscale conversion, smoothing, thresholding,
-        morphological transform, and HSV conversion.
+        and morphological masking (see preprocessing.segment_leaf).
         """
         image = cv2.imread(image_path)
         if image is None:
@@ -68,26 +78,10 @@ class LeafDataset(Dataset):
                 kernel_size = random.choice([3, 5, 7])
                 image = cv2.GaussianBlur(image, (kernel_size, kernel_size), 0)
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Apply Gaussian smoothing
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-        # Otsu's Thresholding
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-        # Morphological Transform
-        kernel = np.ones((3, 3), np.uint8)
-        morph = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-
-        # Bitwise AND operation to retain color
-        result = cv2.bitwise_and(image, image, mask=morph)
-
-        # Convert to HSV color space
-        hsv = cv2.cvtColor(result, cv2.COLOR_BGR2HSV)
-
+        # Shared segmentation, in the same order as inference: resize to the
+        # model input size → grayscale → blur → Otsu → morph close → mask → RGB
         # Convert to PIL format for torchvision transforms
-        return Image.fromarray(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB))
+        return Image.fromarray(segment_leaf(image, size=(INPUT_SIZE, INPUT_SIZE)))
 
     def __len__(self):
         return len(self.image_paths)
@@ -127,18 +121,116 @@ class MixupTransform:
         return mixed_images, labels, labels[index], lam
 
 
+class KnowledgeDistillation:
+    """
+    Hinton-style distillation: blends the student's usual loss with the KL
+    divergence between temperature-softened student and teacher outputs.
+    The teacher is frozen and only ever run in eval mode.
+    """
+    def __init__(self, teacher, temperature=4.0, alpha=0.7):
+        self.teacher = teacher.eval()
+        for param in self.teacher.parameters():
+            param.requires_grad = False
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def to(self, device):
+        self.teacher.to(device)
+        return self
+
+    def __call__(self, outputs, images, hard_loss):
+        with torch.no_grad():
+            teacher_outputs = self.teacher(images)
+        t = self.temperature
+        soft_loss = nn.functional.kl_div(
+            nn.functional.log_softmax(outputs / t, dim=1),
+            nn.functional.softmax(teacher_outputs / t, dim=1),
+            reduction="batchmean",
+        ) * (t * t)
+        return self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def is_main_process():
+    """True on rank 0, or when training in a single process."""
+    return not is_distributed() or dist.get_rank() == 0
+
+
+def log(*args, **kwargs):
+    """print() on rank 0 only, so N processes don't repeat every line."""
+    if is_main_process():
+        print(*args, **kwargs)
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def all_reduce_sum(*values):
+    """Sum plain numbers (or tensors) over all ranks; a no-op in a single process."""
+    if not is_distributed():
+        return values
+    reduced = []
+    for value in values:
+        tensor = value.clone() if torch.is_tensor(value) else torch.tensor(value, dtype=torch.float64)
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+        reduced.append(tensor if torch.is_tensor(value) else tensor.item())
+    return reduced
+
+
+def setup_distributed(backend="gloo"):
+    """
+    Join the process group described by torchrun's environment variables
+    (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT). Returns (rank, world_size).
+    """
+    dist.init_process_group(backend=backend)
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    # Same model init everywhere comes from DDP's broadcast; augmentation
+    # randomness must differ per rank or every process draws the same crops
+    set_seed(42 + rank)
+    return rank, world_size
+
+
 def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=None, 
-               scheduler=None, num_epochs=10, device="cpu", patience=5, mixup=None):
+               scheduler=None, num_epochs=10, device="cpu", patience=5, mixup=None,
+               batch_augment=None, checkpointer=None, resume_state=None, distiller=None,
+               best_model_path="best_leaf_model.pth"):
     """
     Train the ResNet-50 model with the preprocessed dataset.
     Includes early stopping and model checkpoint saving.
+    `batch_augment` (see augment.BatchAugment) is applied on the device to
+    every training batch, before mixup.
+
+    When a process group is initialized (see setup_distributed) the model is
+    wrapped in DistributedDataParallel, loaders built on a DistributedSampler
+    are reshuffled every epoch, validation metrics are all-reduced so every
+    rank takes the same scheduler / early-stopping decisions, and only rank 0
+    logs and writes checkpoints.
+
+    With a `checkpointer` (checkpoint.AsyncCheckpointer) the full training
+    state is written in the background at the end of every epoch, and the
+    best weights go through it too. Pass a loaded checkpoint as
+    `resume_state` to continue from the epoch after it.
+
+    With a `distiller` (KnowledgeDistillation) every training loss is blended
+    with the teacher's soft targets on the same (augmented, mixed) images.
     """
     model.to(device)
+    if batch_augment is not None:
+        batch_augment.to(device)
+    if distiller is not None:
+        distiller.to(device)
+
+    # Gradients are all-reduced by the wrapper; checkpoints keep the bare model's keys
+    train_module = DistributedDataParallel(model) if is_distributed() else model
     
     best_val_loss = float('inf')
     best_val_acc = 0.0
     counter = 0
-    best_model_path = "best_leaf_model.pth"
     
     # Dictionary to store training history
     history = {
@@ -147,22 +239,51 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
         'val_loss': [],
         'val_acc': []
     }
+
+    start_epoch = 0
+    if resume_state is not None:
+        model.load_state_dict(resume_state['model'])
+        optimizer.load_state_dict(resume_state['optimizer'])
+        if scheduler is not None and resume_state.get('scheduler') is not None:
+            scheduler.load_state_dict(resume_state['scheduler'])
+        start_epoch = resume_state['epoch'] + 1
+        best_val_loss = resume_state['best_val_loss']
+        best_val_acc = resume_state['best_val_acc']
+        counter = resume_state['counter']
+        history = resume_state['history']
+        # Only rank 0's generators were saved; other ranks reseed per epoch
+        if is_main_process():
+            restore_rng_state(resume_state['rng'])
+        else:
+            set_seed(42 + dist.get_rank() + 1000 * start_epoch)
+        log(f"Resuming from epoch {start_epoch + 1}/{num_epochs}")
+        if val_loader and counter >= patience:
+            log("Checkpointed run had already stopped early")
+            model.load_state_dict(torch.load(best_model_path))
+            return model, history
     
-    for epoch in range(num_epochs):
+    for epoch in range(start_epoch, num_epochs):
+        if isinstance(train_loader.sampler, DistributedSampler):
+            train_loader.sampler.set_epoch(epoch)
+
         # Training phase
-        model.train()
+        train_module.train()
         running_loss = 0.0
         correct = 0
         total = 0
 
         for i, data in enumerate(train_loader):
+            # Batched augmentation of the raw uint8 batch, on the training device
+            if batch_augment is not None:
+                data = (batch_augment(data[0].to(device, non_blocking=True)), data[1].to(device))
+
             # Apply mixup if provided
             if mixup is not None and random.random() < 0.5:  # Apply to 50% of batches
                 images, labels_a, labels_b, lam = mixup((data[0], data[1]))
                 images, labels_a, labels_b = images.to(device), labels_a.to(device), labels_b.to(device)
-                
+
                 # Forward pass
-                outputs = model(images)
+                outputs = train_module(images)
                 
                 # Mixup loss
                 loss = lam * criterion(outputs, labels_a) + (1 - lam) * criterion(outputs, labels_b)
@@ -174,9 +295,12 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
                 images, labels = images.to(device), labels.to(device)
                 
                 # Forward pass
-                outputs = model(images)
+                outputs = train_module(images)
                 loss = criterion(outputs, labels)
 
+            if distiller is not None:
+                loss = distiller(outputs, images, loss)
+
             # Backpropagation
             optimizer.zero_grad()
             loss.backward()
@@ -195,15 +319,16 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
 
             # Print batch progress
             if i % 10 == 0:
-                print(f"Epoch [{epoch+1}/{num_epochs}], Batch [{i}/{len(train_loader)}], "
-                      f"Loss: {loss.item():.4f}")
+                log(f"Epoch [{epoch+1}/{num_epochs}], Batch [{i}/{len(train_loader)}], "
+                    f"Loss: {loss.item():.4f}")
 
-        train_loss = running_loss/len(train_loader)
+        running_loss, batches, correct, total = all_reduce_sum(running_loss, len(train_loader), correct, total)
+        train_loss = running_loss/batches
         train_acc = 100 * correct / total
         history['train_loss'].append(train_loss)
         history['train_acc'].append(train_acc)
         
-        print(f"Epoch [{epoch+1}/{num_epochs}], Training Loss: {train_loss:.4f}, Training Accuracy: {train_acc:.2f}%")
+        log(f"Epoch [{epoch+1}/{num_epochs}], Training Loss: {train_loss:.4f}, Training Accuracy: {train_acc:.2f}%")
         
         # Validation phase
         if val_loader:
@@ -213,8 +338,9 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
             total = 0
             
             # Track per-class accuracy for validation
-            class_correct = list(0. for _ in range(len(train_loader.dataset.dataset.classes)))
-            class_total = list(0. for _ in range(len(train_loader.dataset.dataset.classes)))
+            classes = train_loader.dataset.dataset.classes
+            class_correct = torch.zeros(len(classes), dtype=torch.long)
+            class_total = torch.zeros(len(classes), dtype=torch.long)
             
             with torch.no_grad():
                 for images, labels in val_loader:
@@ -228,24 +354,26 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
                     correct += (predicted == labels).sum().item()
                     
                     # Calculate per-class accuracy
-                    c = (predicted == labels).squeeze()
-                    for i in range(labels.size(0)):
-                        label = labels[i]
-                        class_correct[label] += c[i].item()
-                        class_total[label] += 1
-            
-            current_val_loss = val_loss/len(val_loader)
+                    labels_cpu = labels.cpu()
+                    class_correct += torch.bincount(labels_cpu[(predicted == labels).cpu()], minlength=len(classes))
+                    class_total += torch.bincount(labels_cpu, minlength=len(classes))
+
+            # Every rank saw a shard of the validation set; combine them
+            val_loss, val_batches, correct, total, class_correct, class_total = all_reduce_sum(
+                val_loss, len(val_loader), correct, total, class_correct, class_total
+            )
+            current_val_loss = val_loss/val_batches
             val_acc = 100 * correct / total
             history['val_loss'].append(current_val_loss)
             history['val_acc'].append(val_acc)
             
-            print(f"Validation Loss: {current_val_loss:.4f}, Validation Accuracy: {val_acc:.2f}%")
+            log(f"Validation Loss: {current_val_loss:.4f}, Validation Accuracy: {val_acc:.2f}%")
             
             # Print per-class validation accuracy
-            for i in range(len(train_loader.dataset.dataset.classes)):
+            for i in range(len(classes)):
                 if class_total[i] > 0:
-                    class_acc = 100 * class_correct[i] / class_total[i]
-                    print(f"Accuracy of {train_loader.dataset.dataset.classes[i]}: {class_acc:.2f}%")
+                    class_acc = 100 * class_correct[i].item() / class_total[i].item()
+                    log(f"Accuracy of {classes[i]}: {class_acc:.2f}%")
             
             # Update learning rate with scheduler
             if scheduler is not None:
@@ -254,7 +382,7 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
                 else:
                     scheduler.step()
                 current_lr = optimizer.param_groups[0]['lr']
-                print(f"Current Learning Rate: {current_lr:.6f}")
+                log(f"Current Learning Rate: {current_lr:.6f}")
             
             # Early stopping and model checkpoint
             if val_acc > best_val_acc:
@@ -262,25 +390,79 @@ def train_model(model, train_loader, val_loader=None, criterion=None, optimizer=
                 best_val_loss = current_val_loss
                 counter = 0
                 # Save best model
-                torch.save(model.state_dict(), best_model_path)
-                print(f"Model improved, saving checkpoint!")
+                if checkpointer is not None:
+                    checkpointer.save_weights(model.state_dict(), best_model_path)
+                elif is_main_process():
+                    torch.save(model.state_dict(), best_model_path)
+                log(f"Model improved, saving checkpoint!")
             else:
                 counter += 1
-                print(f"EarlyStopping counter: {counter} out of {patience}")
-                if counter >= patience:
-                    print(f"Early stopping triggered at epoch {epoch+1}")
-                    # Load best model before returning
-                    model.load_state_dict(torch.load(best_model_path))
-                    return model, history
-
-    # Load best model before returning if we didn't early stop
+                log(f"EarlyStopping counter: {counter} out of {patience}")
+
+        if checkpointer is not None:
+            checkpointer.save({
+                'epoch': epoch,
+                'model': model.state_dict(),
+                'optimizer': optimizer.state_dict(),
+                'scheduler': scheduler.state_dict() if scheduler is not None else None,
+                'best_val_loss': best_val_loss,
+                'best_val_acc': best_val_acc,
+                'counter': counter,
+                'history': history,
+                'rng': rng_state(),
+            }, epoch)
+
+        if val_loader and counter >= patience:
+            log(f"Early stopping triggered at epoch {epoch+1}")
+            break
+
+    # Load best model before returning
+    if checkpointer is not None:
+        checkpointer.wait()
+    barrier()
     if os.path.exists(best_model_path):
         model.load_state_dict(torch.load(best_model_path))
     
     return model, history
 
 if __name__ == "__main__":
-    DATA_DIR = "PlantVillage/train"  # Root directory for training images
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the leaf disease classifier")
+    parser.add_argument("--data-dir", default="PlantVillage/train", help="Root directory for training images")
+    parser.add_argument("--shards", default=None,
+                        help="Train from shards packed by `python shards.py pack` instead of raw images")
+    parser.add_argument("--batch-augment", action="store_true",
+                        help="Augment whole batches on the training device (augment.py) instead of per image in workers")
+    parser.add_argument("--workers", type=int, default=4, help="DataLoader worker processes")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Data-parallel training across processes; launch with torchrun")
+    parser.add_argument("--backend", default="gloo", help="torch.distributed backend (gloo for CPU nodes)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Torch threads per process (default: cores / processes on this node)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Where full training-state checkpoints go")
+    parser.add_argument("--keep-last", type=int, default=KEEP_LAST, help="Epoch checkpoints to keep")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Continue from a checkpoint file, or the newest one in --checkpoint-dir")
+    parser.add_argument("--distill-from", default=None,
+                        help="Train a small student distilled from this ResNet-50 checkpoint instead")
+    parser.add_argument("--student", choices=STUDENT_ARCHS, default="mobilenet_v3_large")
+    parser.add_argument("--class-mapping", default="class_mapping.pth", help="Teacher's class mapping")
+    parser.add_argument("--temperature", type=float, default=4.0, help="Distillation softmax temperature")
+    parser.add_argument("--distill-alpha", type=float, default=0.7,
+                        help="Weight of the teacher's soft targets vs the labels")
+    args = parser.parse_args()
+
+    rank, world_size = 0, 1
+    if args.distributed:
+        rank, world_size = setup_distributed(args.backend)
+        # torchrun pins OMP to 1 thread; split this node's cores between its processes
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+        torch.set_num_threads(args.threads or max(1, (os.cpu_count() or 1) // local_world_size))
+    elif args.threads:
+        torch.set_num_threads(args.threads)
+
+    DATA_DIR = args.data_dir  # Root directory for training images
     VAL_DIR = None  # We'll split the training data instead of using a separate validation set
     
     # Define transformations with stronger augmentation for training
@@ -305,13 +487,30 @@ if __name__ == "__main__":
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
     ])
 
-    # Create the full dataset
-    full_dataset = LeafDataset(DATA_DIR, transform=None, is_train=True)
+    # Batched augmentation: workers only hand over fixed-size uint8 tensors and
+    # the random transforms above run on whole batches inside train_model
+    batch_augment = None
+    if args.batch_augment:
+        batch_augment = BatchAugment()
+        train_transform = ToUint8Tensor(256)
+        val_transform = transforms.Compose([
+            ToUint8Tensor(224),
+            transforms.ConvertImageDtype(torch.float32),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+
+    # Create the full dataset — packed shards skip decoding and masking every epoch
+    if args.shards:
+        full_dataset = ShardDataset(args.shards, as_pil=not args.batch_augment)
+    else:
+        full_dataset = LeafDataset(DATA_DIR, transform=None, is_train=True)
     
     # Split into train and validation sets (80/20 split)
     train_size = int(0.8 * len(full_dataset))
     val_size = len(full_dataset) - train_size
-    train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size])
+    # Explicit generator: every rank must draw the same split
+    train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size],
+                                              generator=torch.Generator().manual_seed(42))
     
     # Apply transformations
     class TransformedSubset(Dataset):
@@ -335,35 +534,55 @@ if __name__ == "__main__":
     val_dataset = TransformedSubset(val_dataset, val_transform)
     
     # Print dataset sizes
-    print(f"Training set size: {len(train_dataset)}")
-    print(f"Validation set size: {len(val_dataset)}")
+    log(f"Training set size: {len(train_dataset)}")
+    log(f"Validation set size: {len(val_dataset)}")
+
+    # Each rank trains and validates on its own 1/world_size of the data
+    train_sampler = val_sampler = None
+    if args.distributed:
+        train_sampler = DistributedSampler(train_dataset, shuffle=True, seed=42)
+        val_sampler = DistributedSampler(val_dataset, shuffle=False)
     
     # DataLoaders with more workers for parallel processing
-    train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True, num_workers=4, pin_memory=True)
-    val_loader = DataLoader(val_dataset, batch_size=16, shuffle=False, num_workers=4, pin_memory=True)
+    train_loader = DataLoader(train_dataset, batch_size=16, shuffle=train_sampler is None, sampler=train_sampler,
+                              num_workers=args.workers, pin_memory=True)
+    val_loader = DataLoader(val_dataset, batch_size=16, shuffle=False, sampler=val_sampler,
+                            num_workers=args.workers, pin_memory=True)
     
     # Create mixup transform
     mixup_transform = MixupTransform(alpha=0.2)
     
-    # Load ResNet model with weights and modify with deeper regularization
-    model = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1)
-    
-    # Freeze only first 4 layers instead of 6 to allow more learning
-    layers_to_freeze = list(model.children())[:4]  
-    for layer in layers_to_freeze:
-        for param in layer.parameters():
-            param.requires_grad = False
-    
-    # Add more regularization in the fully connected layers
     num_classes = len(full_dataset.classes)
-    model.fc = nn.Sequential(
-        nn.Dropout(0.3),  # First dropout layer
-        nn.Linear(2048, 1024),
-        nn.BatchNorm1d(1024),  # Add batch normalization
-        nn.ReLU(),
-        nn.Dropout(0.5),  # Second dropout layer
-        nn.Linear(1024, num_classes)  # Output layer
-    )
+    distiller = None
+    if args.distill_from:
+        # Small ImageNet student, taught by the trained ResNet-50 on the same data
+        teacher_classes = load_class_names(args.class_mapping)
+        if teacher_classes != list(full_dataset.classes):
+            raise SystemExit(f"Teacher classes in {args.class_mapping} don't match the training data")
+        teacher = build_model(num_classes)
+        teacher.load_state_dict(torch.load(args.distill_from, map_location="cpu"))
+        distiller = KnowledgeDistillation(teacher, temperature=args.temperature, alpha=args.distill_alpha)
+        model = build_student(args.student, num_classes, pretrained=True)
+        log(f"Distilling {args.distill_from} into {args.student}")
+    else:
+        # Load ResNet model with weights and modify with deeper regularization
+        model = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1)
+
+        # Freeze only first 4 layers instead of 6 to allow more learning
+        layers_to_freeze = list(model.children())[:4]
+        for layer in layers_to_freeze:
+            for param in layer.parameters():
+                param.requires_grad = False
+
+        # Add more regularization in the fully connected layers
+        model.fc = nn.Sequential(
+            nn.Dropout(0.3),  # First dropout layer
+            nn.Linear(2048, 1024),
+            nn.BatchNorm1d(1024),  # Add batch normalization
+            nn.ReLU(),
+            nn.Dropout(0.5),  # Second dropout layer
+            nn.Linear(1024, num_classes)  # Output layer
+        )
 
     # Loss with label smoothing to prevent overconfidence
     criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
@@ -374,8 +593,21 @@ if __name__ == "__main__":
     # Learning rate scheduler - cosine annealing for better convergence
     scheduler = CosineAnnealingLR(optimizer, T_max=15, eta_min=1e-6)
     
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.distributed else "cpu")
+    log(f"Using device: {device}" + (f" × {world_size} processes ({args.backend})" if args.distributed else ""))
+
+    # Background checkpoint writer (rank 0 only) and optional state to resume from
+    if args.distill_from:
+        # Student checkpoints must never be resumed into the teacher (or vice versa)
+        args.checkpoint_dir = os.path.join(args.checkpoint_dir, args.student)
+    checkpointer = AsyncCheckpointer(args.checkpoint_dir, args.keep_last) if is_main_process() else None
+    resume_state = None
+    if args.resume:
+        resume_path = latest_checkpoint(args.checkpoint_dir) if args.resume == "latest" else args.resume
+        if resume_path is None:
+            raise SystemExit(f"No checkpoint to resume from in {args.checkpoint_dir}")
+        log(f"Loading checkpoint {resume_path}")
+        resume_state = load_checkpoint(resume_path)
 
     # Train model with early stopping
     trained_model, history = train_model(
@@ -388,15 +620,35 @@ if __name__ == "__main__":
         num_epochs=30,  
         device=device,
         patience=10,    # More patience
-        mixup=mixup_transform  # Add mixup augmentation
+        mixup=mixup_transform,  # Add mixup augmentation
+        batch_augment=batch_augment,
+        checkpointer=checkpointer,
+        resume_state=resume_state,
+        distiller=distiller,
+        best_model_path="best_leaf_student.pth" if distiller is not None else "best_leaf_model.pth"
     )
+    if checkpointer is not None:
+        checkpointer.close()
     
-    # Save final model
-    torch.save(trained_model.state_dict(), "leaf_disease_model_final.pth")
-    
-    # Save class mapping for inference
-    class_mapping = {idx: class_name for idx, class_name in enumerate(full_dataset.classes)}
-    torch.save(class_mapping, "class_mapping.pth")
-    
-    print("Training complete! Final model saved.")
-    print(f"Best validation accuracy: {max(history['val_acc']):.2f}%")
\ No newline at end of file
+    if is_main_process() and distiller is not None:
+        # TorchScript with embedded classes, so ModelRegistry can serve the student
+        from quantize import save_scripted
+        trained_model.cpu().eval()
+        torch.save(trained_model.state_dict(), "leaf_disease_student.pth")
+        save_scripted(trained_model, "leaf_disease_student.ts", list(full_dataset.classes),
+                      variant="student", arch=args.student, teacher=args.distill_from)
+        print("Distillation complete! Student saved to leaf_disease_student.ts (serve with CROPLY_CASCADE=1).")
+        print(f"Best validation accuracy: {max(history['val_acc']):.2f}%")
+    elif is_main_process():
+        # Save final model
+        torch.save(trained_model.state_dict(), "leaf_disease_model_final.pth")
+
+        # Save class mapping for inference
+        class_mapping = {idx: class_name for idx, class_name in enumerate(full_dataset.classes)}
+        torch.save(class_mapping, "class_mapping.pth")
+
+        print("Training complete! Final model saved.")
+        print(f"Best validation accuracy: {max(history['val_acc']):.2f}%")
+
+    if args.distributed:
+        dist.destroy_process_group()
\ No newline at end of file
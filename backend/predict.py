@@ -1,82 +1,292 @@
-import cv2
 import torch
-import numpy as np
-from PIL import Image
 import torch.nn as nn
-from torchvision import models, transforms
 import os
+import json
+import time
+import threading
 
-def predict_leaf_disease(image_path, model_path="leaf_disease_model_final.pth", data_dir="Datasets/PlantVillage/train"):
+from ingest import load_image
+from preprocessing import preprocess_image
+from metrics import STAGE_SECONDS, CASCADE_PREDICTIONS
+
+MODEL_PATH = os.getenv("CROPLY_MODEL_PATH", "leaf_disease_model_final.pth")
+CLASS_MAPPING_PATH = os.getenv("CROPLY_CLASS_MAPPING_PATH", "class_mapping.pth")
+
+# "fp32" serves MODEL_PATH, "int8" the quantized TorchScript artifact written
+# by `python quantize.py build`. The loader is picked from the file extension:
+# .pth eager checkpoint, .pt/.ts TorchScript (quantize.py / export.py), .onnx ONNX.
+MODEL_VARIANT = os.getenv("CROPLY_MODEL_VARIANT", "fp32")
+INT8_MODEL_PATH = os.getenv("CROPLY_INT8_MODEL_PATH", "leaf_disease_model_int8.pt")
+
+# Predictions below this confidence (%) are reported as "not a clear leaf"
+CONFIDENCE_THRESHOLD = 40.0
+
+# Cascade mode: a distilled student (`python model.py --distill-from ...`)
+# answers first and only images it is less than CASCADE_THRESHOLD % sure of
+# are re-run through the full model.
+CASCADE_ENABLED = os.getenv("CROPLY_CASCADE", "0") == "1"
+STUDENT_MODEL_PATH = os.getenv("CROPLY_STUDENT_MODEL_PATH", "leaf_disease_student.ts")
+CASCADE_THRESHOLD = float(os.getenv("CROPLY_CASCADE_THRESHOLD", "90"))
+
+STUDENT_ARCHS = ("mobilenet_v3_small", "mobilenet_v3_large", "resnet18")
+
+
+def build_model(num_classes):
     """
-    Function that takes an image path and returns the predicted plant leaf disease category.
+    Build the ResNet-50 classifier with the EXACT same head as in training.
     """
-    # Get class names in the same order as during training
-    CLASS_NAMES = sorted(os.listdir(data_dir))
-    
-    # Load the model with the same architecture as training
+    # Only the eager checkpoint needs torchvision; exported artifacts don't
+    from torchvision import models
+
     model = models.resnet50(weights=None)
-    
-    # Use the EXACT same model architecture as in training
     model.fc = nn.Sequential(
         nn.Dropout(0.3),
         nn.Linear(2048, 1024),
         nn.BatchNorm1d(1024),
         nn.ReLU(),
         nn.Dropout(0.5),
-        nn.Linear(1024, len(CLASS_NAMES))
+        nn.Linear(1024, num_classes)
     )
-    
-    # Load the trained model weights
+    return model
+
+
+def build_student(arch, num_classes, pretrained=False):
+    """
+    Small classifier for distillation, with an ImageNet backbone and its
+    last layer resized to `num_classes`.
+    """
+    from torchvision import models
+
+    if arch not in STUDENT_ARCHS:
+        raise ValueError(f"Unknown student architecture '{arch}' (expected one of {', '.join(STUDENT_ARCHS)})")
+    weights = "DEFAULT" if pretrained else None
+    model = getattr(models, arch)(weights=weights)
+    if arch == "resnet18":
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    else:
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    return model
+
+
+def load_class_names(mapping_path=CLASS_MAPPING_PATH):
+    """
+    Read the {index: class_name} mapping written by model.py and return
+    the class names ordered by index.
+    """
+    class_mapping = torch.load(mapping_path, map_location="cpu")
+    return [class_mapping[idx] for idx in sorted(class_mapping)]
+
+
+def load_scripted(model_path):
+    """
+    Load a TorchScript artifact written by quantize.py or export.py. Returns
+    the module, the embedded class names (or None) and the archive metadata.
+    """
+    extra_files = {"class_names.json": "", "metadata.json": ""}
+    model = torch.jit.load(model_path, map_location="cpu", _extra_files=extra_files)
+    metadata = json.loads(extra_files["metadata.json"] or "{}")
+    if metadata.get("engine"):
+        # Quantized kernels must run on the engine they were packed for
+        torch.backends.quantized.engine = metadata["engine"]
+    class_names = json.loads(extra_files["class_names.json"]) if extra_files["class_names.json"] else None
+    return model.eval(), class_names, metadata
+
+
+class OnnxModel:
+    """
+    Callable wrapper so an ONNX Runtime session can stand in for the torch model.
+    ONNX Runtime is not fork-safe and sizes its intra-op pool from the torch
+    thread count at creation, so build it in the process that will run it,
+    after torch.set_num_threads (serve.py leaves it to each worker).
+    """
+    def __init__(self, model_path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.pid = os.getpid()
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.class_names = json.loads(metadata["class_names"]) if "class_names" in metadata else None
+
+    def __call__(self, batch):
+        if os.getpid() != self.pid:
+            raise RuntimeError("ONNX Runtime session was created before fork; load the model in the worker")
+        outputs = self.session.run(None, {self.input_name: batch.numpy()})[0]
+        return torch.from_numpy(outputs)
+
+
+def load_model_artifact(model_path, num_classes=None):
+    """
+    Load any supported model file. Returns (model, class_names, metadata);
+    class_names is None when the file doesn't embed them.
+    """
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension == ".onnx":
+        model = OnnxModel(model_path)
+        return model, model.class_names, {"format": "onnx"}
+    if extension in (".pt", ".ts"):
+        return load_scripted(model_path)
+
+    model = build_model(num_classes)
     model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-    model.eval()
-    
-    # Preprocess image using same pipeline as training
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"Error: Unable to load image from {image_path}")
-        
-    # Apply preprocessing pipeline similar to the dataset class
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    kernel = np.ones((3, 3), np.uint8)
-    morph = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-    result = cv2.bitwise_and(image, image, mask=morph)
-    hsv = cv2.cvtColor(result, cv2.COLOR_BGR2HSV)
-    img = Image.fromarray(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB))
-    
-    # Apply transforms like in validation
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    img_tensor = transform(img).unsqueeze(0)
-    
-    # Make prediction
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        _, predicted = torch.max(outputs, 1)
-        prediction_idx = predicted.item()
-    
-    # Calculate confidence score
-    probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-    confidence = probabilities[prediction_idx].item() * 100
-    
-    return {
-        'category': CLASS_NAMES[prediction_idx],
-        'confidence': confidence
-    }
+    return model.eval(), None, {"format": "eager"}
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the trained classifier and its class names.
+    The weights are loaded once (at startup or on first use) and then shared
+    by every request instead of being rebuilt per prediction.
+    """
+    def __init__(self, model_path=None, mapping_path=CLASS_MAPPING_PATH, variant=MODEL_VARIANT):
+        if variant not in ("fp32", "int8"):
+            raise ValueError(f"Unknown model variant '{variant}' (expected 'fp32' or 'int8')")
+        self.variant = variant
+        self.model_path = model_path or (INT8_MODEL_PATH if variant == "int8" else MODEL_PATH)
+        self.mapping_path = mapping_path
+        self.model = None
+        self.class_names = None
+        self.channels_last = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self.model is not None
+
+    @property
+    def fork_safe(self):
+        """Whether the model may be loaded before forking workers (ONNX Runtime sessions may not)."""
+        return os.path.splitext(self.model_path)[1].lower() != ".onnx"
+
+    def load(self):
+        """Load the weights and class list if they aren't resident yet."""
+        if self.model is not None:
+            return self
+        with self._lock:
+            if self.model is None:
+                started = time.perf_counter()
+                class_names = None
+                if os.path.splitext(self.model_path)[1].lower() == ".pth":
+                    class_names = load_class_names(self.mapping_path)
+                model, embedded_names, metadata = load_model_artifact(
+                    self.model_path, len(class_names) if class_names else None
+                )
+                self.class_names = class_names or embedded_names or load_class_names(self.mapping_path)
+                self.channels_last = metadata.get("memory_format") == "channels_last"
+                self.model = model
+                STAGE_SECONDS.observe(time.perf_counter() - started, "model_load")
+                print(f"Loaded {metadata.get('format', 'torchscript')} model {self.model_path} with {len(self.class_names)} classes")
+        return self
+
+
+# Shared registry used by the API and the CLI
+registry = ModelRegistry()
+
+
+def classify_batch(batch, model_registry=None):
+    """
+    Run a (N, 3, 224, 224) batch through the resident classifier and return
+    one {'category', 'confidence'} dict per image.
+    """
+    model_registry = (model_registry or registry).load()
+
+    if model_registry.channels_last:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+
+    with torch.inference_mode(), STAGE_SECONDS.time("forward"):
+        outputs = model_registry.model(batch)
+        probabilities = torch.nn.functional.softmax(outputs, dim=1)
+        confidences, predicted = torch.max(probabilities, 1)
+
+    return [
+        {
+            'category': model_registry.class_names[idx],
+            'confidence': conf * 100
+        }
+        for idx, conf in zip(predicted.tolist(), confidences.tolist())
+    ]
+
+
+class CascadeClassifier:
+    """
+    Student-first inference: every batch runs through the small student and
+    only the images whose student confidence is below `threshold` (%) are
+    escalated to the teacher. Both registries must share the class list.
+    """
+    def __init__(self, student, teacher, threshold=CASCADE_THRESHOLD):
+        self.student = student
+        self.teacher = teacher
+        self.threshold = threshold
+        self.images = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self.student.is_loaded and self.teacher.is_loaded
+
+    def load(self):
+        self.student.load()
+        self.teacher.load()
+        if list(self.student.class_names) != list(self.teacher.class_names):
+            raise ValueError(f"Student {self.student.model_path} and teacher {self.teacher.model_path} "
+                             "were trained on different classes")
+        return self
+
+    def classify(self, batch):
+        """Same contract as `classify_batch`: one {'category', 'confidence'} per image."""
+        results = classify_batch(batch, self.student)
+        unsure = [i for i, r in enumerate(results) if r['confidence'] < self.threshold]
+        if unsure:
+            for i, result in zip(unsure, classify_batch(batch[unsure], self.teacher)):
+                results[i] = result
+        with self._lock:
+            self.images += len(results)
+            self.escalated += len(unsure)
+        CASCADE_PREDICTIONS.inc("student", amount=len(results) - len(unsure))
+        CASCADE_PREDICTIONS.inc("teacher", amount=len(unsure))
+        return results
+
+    def reset_stats(self):
+        with self._lock:
+            self.images = self.escalated = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": self.images,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.images if self.images else None,
+            }
+
+
+# Shared cascade (None unless CROPLY_CASCADE=1)
+cascade = CascadeClassifier(ModelRegistry(STUDENT_MODEL_PATH), registry) if CASCADE_ENABLED else None
+
+
+def predict_leaf_disease(image_path, model_registry=None):
+    """
+    Function that takes an image path and returns the predicted plant leaf disease category.
+    """
+    with STAGE_SECONDS.time("load"):
+        image = load_image(image_path)
+    with STAGE_SECONDS.time("preprocess"):
+        img_tensor = preprocess_image(image).unsqueeze(0)
+    if model_registry is None and cascade is not None:
+        return cascade.classify(img_tensor)[0]
+    return classify_batch(img_tensor, model_registry)[0]
 
 if __name__ == "__main__":
     try:
         # You can provide a command-line argument for the image path if needed
         import sys
         image_path = sys.argv[1] if len(sys.argv) > 1 else "test5.jpeg"
-        
+
         result = predict_leaf_disease(image_path)
         print(f"This leaf is: {result['category']}")
         print(f"Confidence: {result['confidence']:.2f}%")
-        
+
     except Exception as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
@@ -0,0 +1,213 @@
+"""
+Croply AI — Image Preprocessing
+Leaf segmentation and tensor conversion shared by training (model.py) and
+inference (predict.py / main.py).
+
+Pipeline: resize → grayscale → blur → Otsu → morph close → mask, then a
+single lookup-table pass that swaps BGR→RGB, scales to [0, 1] and applies the
+ImageNet normalization straight into a preallocated float32 buffer.
+
+`leaf_gate` is a few-millisecond check on a thumbnail that rejects obvious
+non-leaf uploads (blank frames, screenshots, selfies) before the classifier.
+"""
+
+import os
+from typing import NamedTuple, Optional, Sequence
+
+import cv2
+import numpy as np
+import torch
+
+INPUT_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# _LUT[c, v] == (v / 255 - MEAN[c]) / STD[c] for every uint8 value v
+_LUT = ((np.arange(256, dtype=np.float32)[None, :] / 255.0) - MEAN[:, None]) / STD[:, None]
+
+_KERNEL = np.ones((3, 3), np.uint8)
+
+# Leaf-validity gate thresholds. Off by default until `python evaluate.py --gate`
+# on the validation split shows an acceptable false-reject rate: the hue band
+# can miss heavily necrotic (brown / yellow) leaves such as late blight or scorch.
+GATE_ENABLED = os.getenv("CROPLY_GATE", "0") == "1"
+GATE_MIN_STD = float(os.getenv("CROPLY_GATE_MIN_STD", "6"))
+GATE_MIN_PLANT_FRACTION = float(os.getenv("CROPLY_GATE_MIN_PLANT_FRACTION", "0.03"))
+GATE_MIN_FOREGROUND = float(os.getenv("CROPLY_GATE_MIN_FOREGROUND", "0.02"))
+GATE_MAX_FOREGROUND = float(os.getenv("CROPLY_GATE_MAX_FOREGROUND", "0.98"))
+_GATE_SIZE = 64
+
+# OpenCV HSV (hue 0-180): yellow-green through green to teal, with enough
+# saturation and brightness to be foliage rather than grey, white or skin.
+# Lower CROPLY_GATE_HUE_MIN (~10) to count brown necrotic tissue as plant.
+_PLANT_HSV_LOW = np.array([int(os.getenv("CROPLY_GATE_HUE_MIN", "20")), 50, 30], np.uint8)
+_PLANT_HSV_HIGH = np.array([int(os.getenv("CROPLY_GATE_HUE_MAX", "95")), 255, 255], np.uint8)
+
+
+def leaf_mask(image: np.ndarray) -> np.ndarray:
+    """
+    Foreground mask of a BGR image: grayscale → Gaussian blur → Otsu's
+    threshold → morphological close. Returns a uint8 array of 0/255.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _KERNEL)
+
+
+class GateResult(NamedTuple):
+    passed: bool
+    reason: Optional[str]
+    stats: dict
+
+
+def leaf_gate(image: np.ndarray, min_std: float = GATE_MIN_STD,
+              min_plant_fraction: float = GATE_MIN_PLANT_FRACTION,
+              min_foreground: float = GATE_MIN_FOREGROUND,
+              max_foreground: float = GATE_MAX_FOREGROUND) -> GateResult:
+    """
+    Cheap pre-classification check on a 64×64 thumbnail of a BGR image.
+    Rejects it as `blank` (almost no contrast), `no_foreground` (the Otsu
+    mask the classifier would use is empty or covers everything) or
+    `not_plant` (too few foliage-coloured pixels).
+    """
+    small = cv2.resize(image, (_GATE_SIZE, _GATE_SIZE), interpolation=cv2.INTER_AREA)
+    gray_std = float(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).std())
+    foreground = float(np.count_nonzero(leaf_mask(small))) / small.shape[0] / small.shape[1]
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    plant = float(np.count_nonzero(cv2.inRange(hsv, _PLANT_HSV_LOW, _PLANT_HSV_HIGH))) / small.shape[0] / small.shape[1]
+    stats = {"gray_std": gray_std, "foreground_fraction": foreground, "plant_fraction": plant}
+
+    if gray_std < min_std:
+        return GateResult(False, "blank", stats)
+    if not min_foreground <= foreground <= max_foreground:
+        return GateResult(False, "no_foreground", stats)
+    if plant < min_plant_fraction:
+        return GateResult(False, "not_plant", stats)
+    return GateResult(True, None, stats)
+
+
+def segment_leaf(image: np.ndarray, size: Optional[tuple] = None) -> np.ndarray:
+    """
+    Mask out the background of a BGR image and return it as RGB uint8.
+    When `size` (width, height) is given the image is resized first, so the
+    segmentation only touches the pixels the model will actually see.
+
+    The old BGR → HSV → RGB round trip was only a colour-order swap (plus
+    8-bit hue quantisation), so it is done directly here.
+    """
+    if size is not None and image.shape[1::-1] != tuple(size):
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    masked = cv2.bitwise_and(image, image, mask=leaf_mask(image))
+    return cv2.cvtColor(masked, cv2.COLOR_BGR2RGB)
+
+
+def _masked_bgr(image: np.ndarray) -> np.ndarray:
+    """Resize to the model input size and zero the background, staying in BGR."""
+    if image.shape[:2] != (INPUT_SIZE, INPUT_SIZE):
+        image = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_AREA)
+    return cv2.bitwise_and(image, image, mask=leaf_mask(image))
+
+
+def _normalize_into(masked_bgr: np.ndarray, out: np.ndarray) -> None:
+    """
+    Write a (3, H, W) normalized RGB float32 view of a BGR uint8 image into
+    `out`. Channel swap, scaling and normalization are one table lookup.
+    """
+    for c in range(3):
+        np.take(_LUT[c], masked_bgr[:, :, 2 - c], out=out[c])
+
+
+def preprocess_image(image: np.ndarray) -> torch.Tensor:
+    """
+    Preprocess one BGR image into a normalized (3, 224, 224) float32 tensor.
+    """
+    out = torch.empty((3, INPUT_SIZE, INPUT_SIZE), dtype=torch.float32)
+    _normalize_into(_masked_bgr(image), out.numpy())
+    return out
+
+
+def preprocess_batch(images: Sequence[np.ndarray], out: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    Preprocess N BGR images into a (N, 3, 224, 224) float32 batch.
+    Pass a preallocated `out` tensor to reuse its memory across calls.
+    """
+    if out is None:
+        out = torch.empty((len(images), 3, INPUT_SIZE, INPUT_SIZE), dtype=torch.float32)
+    buffer = out.numpy()
+    for i, image in enumerate(images):
+        _normalize_into(_masked_bgr(image), buffer[i])
+    return out[:len(images)]
+
+
+def reference_preprocess(image: np.ndarray) -> torch.Tensor:
+    """
+    The original full-resolution pipeline (HSV round trip, PIL resize,
+    torchvision ToTensor/Normalize). Kept only for the parity check below.
+    """
+    from PIL import Image
+    from torchvision import transforms
+
+    result = cv2.bitwise_and(image, image, mask=leaf_mask(image))
+    hsv = cv2.cvtColor(result, cv2.COLOR_BGR2HSV)
+    img = Image.fromarray(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB))
+    transform = transforms.Compose([
+        transforms.Resize((INPUT_SIZE, INPUT_SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=MEAN.tolist(), std=STD.tolist())
+    ])
+    return transform(img)
+
+
+def check_parity(image_paths: Sequence[str], model_registry=None) -> dict:
+    """
+    Compare the fused pipeline (fed by the reduced-resolution decoder) with
+    the original full-resolution pipeline. Reports the per-pixel difference
+    and, when a model registry is given, top-1 agreement between the two.
+    """
+    from ingest import load_image
+
+    originals, reduced = [], []
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            raise FileNotFoundError(f"Error: Unable to load image from {path}")
+        originals.append(reference_preprocess(image))
+        reduced.append(load_image(path))
+
+    expected = torch.stack(originals)
+    actual = preprocess_batch(reduced)
+    diff = (actual - expected).abs()
+    report = {
+        "images": len(image_paths),
+        "mean_abs_diff": diff.mean().item(),
+        "max_abs_diff": diff.max().item(),
+    }
+
+    if model_registry is not None:
+        from predict import classify_batch
+        before = classify_batch(expected, model_registry)
+        after = classify_batch(actual, model_registry)
+        agree = sum(b["category"] == a["category"] for b, a in zip(before, after))
+        report["top1_agreement"] = agree / len(image_paths)
+        report["max_confidence_drift"] = max(abs(b["confidence"] - a["confidence"]) for b, a in zip(before, after))
+
+    return report
+
+
+if __name__ == "__main__":
+    # Parity check: python preprocessing.py <image> [<image> ...] [--model]
+    import sys
+
+    args = [a for a in sys.argv[1:] if a != "--model"]
+    if not args:
+        print("Usage: python preprocessing.py <image> [<image> ...] [--model]")
+        sys.exit(1)
+
+    model_registry = None
+    if "--model" in sys.argv:
+        from predict import registry
+        model_registry = registry
+
+    for key, value in check_parity(args, model_registry).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,190 @@
+"""
+Croply AI — INT8 Quantization
+Post-training static quantization of the served classifier (FX graph mode),
+calibrated on a sample of the PlantVillage train split, plus a harness that
+measures how far the INT8 model drifts from fp32 and how much faster it is.
+
+    python quantize.py build     # calibrates on Datasets/PlantVillage/train
+    python quantize.py compare   # measures on Datasets/PlantVillage/val
+
+`compare` never scores the images the model was calibrated on: if its data
+directory is the calibration directory, the calibration sample is excluded.
+
+Serve the result with CROPLY_MODEL_VARIANT=int8.
+"""
+
+import io
+import os
+import json
+import copy
+import time
+import random
+import argparse
+import statistics
+
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from ingest import load_image
+from preprocessing import INPUT_SIZE, preprocess_batch
+from predict import ModelRegistry, INT8_MODEL_PATH, MODEL_PATH, CLASS_MAPPING_PATH
+
+QUANTIZED_ENGINE = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+
+CALIBRATION_DIR = "Datasets/PlantVillage/train"
+HELD_OUT_DIR = "Datasets/PlantVillage/val"
+CALIBRATION_SAMPLES = 512
+
+
+def sample_images(data_dir, samples, seed=0, exclude=()):
+    """Random sample of image paths from a class-per-directory dataset, minus `exclude`."""
+    exclude = {os.path.realpath(p) for p in exclude}
+    paths = []
+    for class_name in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, class_name)
+        if os.path.isdir(class_dir):
+            paths.extend(
+                os.path.join(class_dir, name) for name in sorted(os.listdir(class_dir))
+                if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+            )
+    random.Random(seed).shuffle(paths)
+    if exclude:
+        paths = [p for p in paths if os.path.realpath(p) not in exclude]
+    return paths[:samples] if samples else paths
+
+
+def iter_batches(paths, batch_size):
+    """Yield preprocessed (N, 3, 224, 224) batches through the production path."""
+    buffer = torch.empty((batch_size, 3, INPUT_SIZE, INPUT_SIZE))
+    for start in range(0, len(paths), batch_size):
+        images = [load_image(p) for p in paths[start:start + batch_size]]
+        yield preprocess_batch(images, out=buffer)
+
+
+def quantize_model(model, calibration_batches, engine=QUANTIZED_ENGINE):
+    """
+    Insert observers, run the calibration batches through them and convert
+    the model to INT8. Conv/BN/ReLU and Linear/BN1d/ReLU are fused on the way.
+    """
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).eval()
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example,))
+
+    with torch.inference_mode():
+        for batch in calibration_batches:
+            prepared(batch)
+
+    return convert_fx(prepared)
+
+
+def save_scripted(model, path, class_names, **metadata):
+    """Trace to TorchScript and embed the class list so serving needs nothing else."""
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.inference_mode():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example).eval())
+    metadata = {"format": "torchscript", **metadata}
+    extra_files = {"class_names.json": json.dumps(class_names), "metadata.json": json.dumps(metadata)}
+    torch.jit.save(scripted, path, _extra_files=extra_files)
+
+
+def serialized_mb(model):
+    """
+    File size of the model when serialized (state_dict for eager, archive for
+    scripted). Not its resident memory, which also includes the runtime.
+    """
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def measure_latency(model, batch_size, iterations=20, warmup=3):
+    """Median forward latency in ms for a random batch."""
+    batch = torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+    timings = []
+    with torch.inference_mode():
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            model(batch)
+            if i >= warmup:
+                timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def compare(fp32_registry, int8_registry, paths, batch_size=16):
+    """
+    Top-1 agreement and confidence drift of INT8 vs fp32 on `paths`, plus
+    latency and serialized file size of both models.
+    """
+    fp32_model, int8_model = fp32_registry.load().model, int8_registry.load().model
+    agree, total, drifts = 0, 0, []
+
+    with torch.inference_mode():
+        for batch in iter_batches(paths, batch_size):
+            p32 = torch.softmax(fp32_model(batch), dim=1)
+            p8 = torch.softmax(int8_model(batch), dim=1)
+            top32, top8 = p32.argmax(1), p8.argmax(1)
+            agree += (top32 == top8).sum().item()
+            total += batch.shape[0]
+            # Drift of the fp32 winner's confidence, in percentage points
+            drifts.extend(((p8.gather(1, top32[:, None]) - p32.gather(1, top32[:, None])).abs() * 100).flatten().tolist())
+
+    report = {
+        "images": total,
+        "top1_agreement": agree / total if total else None,
+        "mean_confidence_drift": statistics.fmean(drifts) if drifts else None,
+        "max_confidence_drift": max(drifts) if drifts else None,
+    }
+    for name, model in (("fp32", fp32_model), ("int8", int8_model)):
+        report[f"{name}_file_size_mb"] = serialized_mb(model)
+        report[f"{name}_latency_ms_b1"] = measure_latency(model, 1)
+        report[f"{name}_latency_ms_b{batch_size}"] = measure_latency(model, batch_size)
+    report["file_size_reduction"] = report["fp32_file_size_mb"] / report["int8_file_size_mb"]
+    report["speedup_b1"] = report["fp32_latency_ms_b1"] / report["int8_latency_ms_b1"]
+    report[f"speedup_b{batch_size}"] = report[f"fp32_latency_ms_b{batch_size}"] / report[f"int8_latency_ms_b{batch_size}"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and evaluate the INT8 classifier")
+    parser.add_argument("command", choices=["build", "compare"])
+    parser.add_argument("--data-dir", default=None,
+                        help=f"Images to calibrate / compare on (default: {CALIBRATION_DIR} / {HELD_OUT_DIR})")
+    parser.add_argument("--samples", type=int, default=CALIBRATION_SAMPLES, help="Images to calibrate / compare on (0 = all)")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR,
+                        help="Where `build` calibrated; `compare` excludes that sample when run on the same directory")
+    parser.add_argument("--calibration-samples", type=int, default=CALIBRATION_SAMPLES)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--output", default=INT8_MODEL_PATH)
+    args = parser.parse_args()
+
+    fp32 = ModelRegistry(args.model_path, args.class_mapping, variant="fp32")
+    if args.command == "build":
+        args.data_dir = args.data_dir or CALIBRATION_DIR
+        paths = sample_images(args.data_dir, args.samples)
+    else:
+        args.data_dir = args.data_dir or HELD_OUT_DIR
+        # Same seed and sampler as `build`, so these are exactly the calibration images
+        calibration = (sample_images(args.calibration_dir, args.calibration_samples)
+                       if os.path.realpath(args.data_dir) == os.path.realpath(args.calibration_dir) else ())
+        paths = sample_images(args.data_dir, args.samples, exclude=calibration)
+        if calibration:
+            print(f"Excluding the {len(calibration)} calibration images from {args.data_dir}")
+
+    if args.command == "build":
+        fp32.load()
+        print(f"Calibrating on {len(paths)} images from {args.data_dir}")
+        quantized = quantize_model(fp32.model, iter_batches(paths, args.batch_size))
+        save_scripted(quantized, args.output, fp32.class_names,
+                      variant="int8", engine=QUANTIZED_ENGINE, source=args.model_path)
+        print(f"Saved INT8 model to {args.output}")
+    else:
+        int8 = ModelRegistry(args.output, args.class_mapping, variant="int8")
+        for key, value in compare(fp32, int8, paths, args.batch_size).items():
+            print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,171 @@
+"""
+Croply AI — Multi-worker Server
+Pre-forking launcher for multi-core hosts. The parent process imports
+torch/cv2, loads the classifier once, moves its weights into shared memory
+and binds the listening socket. It then forks N uvicorn workers that inherit
+all of it, so every worker shares one copy of the model instead of loading
+its own. ONNX artifacts are the exception: ONNX Runtime is not fork-safe, so
+each worker creates its own session once its thread count is pinned.
+
+    python serve.py --workers 4 --port 8000
+
+Send SIGUSR1 to the parent to print per-worker memory (Linux only).
+
+Every worker accepts on the one shared socket, so GET /metrics there reaches
+a random worker. With --metrics-port P, worker i (0-based, kept across
+restarts) serves its own metrics on port P + i; scrape each of those.
+
+Chat conversations must be visible to every worker, so with more than one
+worker CROPLY_CONVERSATION_DB defaults to a shared SQLite file.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+from typing import Optional
+
+import cv2
+import torch
+import uvicorn
+
+from predict import registry, cascade
+import llm
+import metrics
+
+WORKERS = int(os.getenv("CROPLY_WORKERS", "0")) or os.cpu_count() or 1
+TORCH_THREADS = int(os.getenv("CROPLY_TORCH_THREADS", "0"))
+METRICS_PORT = int(os.getenv("CROPLY_METRICS_PORT", "0"))
+SHARED_CONVERSATION_DB = "conversations.db"
+
+
+def threads_per_worker(workers: int) -> int:
+    """Split the cores evenly so workers don't oversubscribe the CPU."""
+    return TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def memory_usage(pid: int) -> dict:
+    """Rss / Pss / private memory of a process in MB, from /proc/<pid>/smaps_rollup."""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                usage[key] = int(value.split()[0]) / 1024
+    usage["Private"] = usage.pop("Private_Clean", 0) + usage.pop("Private_Dirty", 0)
+    return usage
+
+
+def run_worker(sock: socket.socket, threads: int, log_level: str, workers: int,
+               metrics_address: Optional[tuple] = None) -> None:
+    """Body of a forked worker: pin thread pools and serve on the shared socket."""
+    if metrics_address is not None:
+        metrics.serve_http(*metrics_address)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    # Each worker schedules its own Groq calls, so each gets its share of the quota
+    llm.scheduler.scale(1 / workers)
+    config = uvicorn.Config("main:app", log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Croply AI with shared-memory model weights")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Worker i serves its own /metrics on this port + i (0 = off)")
+    args = parser.parse_args()
+
+    # Load torch models once, then back the weights with shared memory so no
+    # worker ever ends up with a private copy of a page. ONNX sessions load
+    # in each worker's warmup instead.
+    for model_registry in ((cascade.student, registry) if cascade else (registry,)):
+        if not model_registry.fork_safe:
+            continue
+        model_registry.load()
+        if isinstance(model_registry.model, torch.nn.Module):
+            model_registry.model.share_memory()
+
+    # Workers import main (and read this) after the fork; llm has already loaded .env
+    if args.workers > 1 and not os.getenv("CROPLY_CONVERSATION_DB"):
+        os.environ["CROPLY_CONVERSATION_DB"] = SHARED_CONVERSATION_DB
+        print(f"Sharing chat conversations between workers via {SHARED_CONVERSATION_DB}")
+
+    sock = bind_socket(args.host, args.port)
+    threads = threads_per_worker(args.workers)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers × {threads} torch threads")
+    if args.metrics_port:
+        print(f"Worker metrics on ports {args.metrics_port}-{args.metrics_port + args.workers - 1}")
+
+    workers = {}
+    shutting_down = False
+
+    def spawn(slot):
+        metrics_address = (args.host, args.metrics_port + slot) if args.metrics_port else None
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+                signal.signal(sig, signal.SIG_DFL)
+            try:
+                run_worker(sock, threads, args.log_level, args.workers, metrics_address)
+            finally:
+                os._exit(0)
+        workers[pid] = (time.time(), slot)
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    def report(signum, frame):
+        for pid in [os.getpid(), *workers]:
+            role = "parent" if pid == os.getpid() else "worker"
+            usage = memory_usage(pid)
+            print(f"{role} {pid}: " + ", ".join(f"{k} {v:.0f} MB" for k, v in usage.items()), flush=True)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+
+    for slot in range(args.workers):
+        spawn(slot)
+
+    # Reap workers and replace any that crash
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        entry = workers.pop(pid, None)
+        if not shutting_down and entry is not None:
+            started, slot = entry
+            print(f"Worker {pid} exited with status {status}, restarting")
+            # Avoid a tight respawn loop when workers fail at startup
+            if time.time() - started < 1:
+                time.sleep(1)
+            # Same slot, so the replacement keeps its metrics port
+            spawn(slot)
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
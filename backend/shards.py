@@ -0,0 +1,148 @@
+"""
+Croply AI — Packed Dataset Shards
+One-time packing of a class-per-directory image dataset into memory-mapped
+uint8 shards. Every image is decoded and segmented once, so training epochs
+only slice arrays out of the page cache. The mask is computed at the model
+input size, exactly as at inference (and in LeafDataset); the masked image
+is then stored at a larger base resolution for the random crops.
+
+    python shards.py pack --data-dir PlantVillage/train --output PlantVillage/shards
+
+Layout of the output directory:
+    index.json           classes, base size, shard files and counts
+    labels.npy           int64 label per image, in packing order
+    shard_000.npy ...    (N, size, size, 3) uint8 RGB, already masked
+"""
+
+import os
+import json
+import bisect
+import argparse
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+from preprocessing import INPUT_SIZE, segment_leaf
+
+BASE_SIZE = 256
+SHARD_SIZE = 8192
+
+
+def list_images(image_dir):
+    """(classes, paths, labels) for a class-per-directory dataset, sorted like LeafDataset."""
+    classes = sorted(d for d in os.listdir(image_dir) if os.path.isdir(os.path.join(image_dir, d)))
+    paths, labels = [], []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(image_dir, class_name)
+        for img_name in sorted(os.listdir(class_dir)):
+            if img_name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                paths.append(os.path.join(class_dir, img_name))
+                labels.append(label)
+    return classes, paths, labels
+
+
+def _load_segmented(args):
+    path, size = args
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Error: Unable to load image from {path}")
+    # Mask at the served resolution, then scale to the stored base size
+    segmented = segment_leaf(image, size=(INPUT_SIZE, INPUT_SIZE))
+    if size != INPUT_SIZE:
+        segmented = cv2.resize(segmented, (size, size), interpolation=cv2.INTER_LINEAR)
+    return segmented
+
+
+def pack(image_dir, output_dir, size=BASE_SIZE, shard_size=SHARD_SIZE, workers=None):
+    """Decode, segment and write every image of `image_dir` into shards."""
+    classes, paths, labels = list_images(image_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Packing {len(paths)} images across {len(classes)} classes into {output_dir}")
+
+    shards = []
+    with Pool(workers) as pool:
+        for shard_idx, start in enumerate(range(0, len(paths), shard_size)):
+            chunk = paths[start:start + shard_size]
+            file_name = f"shard_{shard_idx:03d}.npy"
+            shard = np.lib.format.open_memmap(
+                os.path.join(output_dir, file_name), mode="w+", dtype=np.uint8,
+                shape=(len(chunk), size, size, 3),
+            )
+            for i, image in enumerate(pool.imap(_load_segmented, ((p, size) for p in chunk), chunksize=32)):
+                shard[i] = image
+            shard.flush()
+            del shard
+            shards.append({"file": file_name, "count": len(chunk)})
+            print(f"Wrote {file_name} ({start + len(chunk)}/{len(paths)})")
+
+    np.save(os.path.join(output_dir, "labels.npy"), np.asarray(labels, dtype=np.int64))
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump({"classes": classes, "size": size, "count": len(paths), "shards": shards}, f, indent=2)
+    return output_dir
+
+
+class ShardDataset(Dataset):
+    """
+    Dataset over packed shards. Items are zero-copy views into the memory-
+    mapped files: a (3, size, size) uint8 tensor, or a PIL image when
+    `as_pil=True` (for the existing torchvision PIL transforms).
+    """
+    def __init__(self, shard_dir, transform=None, as_pil=False):
+        self.shard_dir = shard_dir
+        self.transform = transform
+        self.as_pil = as_pil
+        with open(os.path.join(shard_dir, "index.json")) as f:
+            self.index = json.load(f)
+        self.classes = self.index["classes"]
+        self.class_to_idx = {cls_name: i for i, cls_name in enumerate(self.classes)}
+        self.labels = np.load(os.path.join(shard_dir, "labels.npy"))
+        self._offsets = np.cumsum([0] + [s["count"] for s in self.index["shards"]]).tolist()
+        # Opened lazily so every DataLoader worker maps the files itself
+        self._shards = None
+
+        print(f"Found {len(self)} packed images in {shard_dir} across {len(self.classes)} classes")
+
+    def _open(self):
+        # Copy-on-write mapping: writable for torch.from_numpy, but nothing is copied unless written
+        self._shards = [
+            np.load(os.path.join(self.shard_dir, s["file"]), mmap_mode="c") for s in self.index["shards"]
+        ]
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __getitem__(self, idx):
+        if self._shards is None:
+            self._open()
+        if idx < 0:
+            idx += len(self)
+        shard_idx = bisect.bisect_right(self._offsets, idx) - 1
+        array = self._shards[shard_idx][idx - self._offsets[shard_idx]]
+        label = int(self.labels[idx])
+
+        if self.as_pil:
+            image = Image.fromarray(array)
+        else:
+            image = torch.from_numpy(array).permute(2, 0, 1)
+
+        if self.transform:
+            image = self.transform(image)
+
+        return image, label
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack an image dataset into memory-mapped shards")
+    parser.add_argument("command", choices=["pack"])
+    parser.add_argument("--data-dir", default="PlantVillage/train")
+    parser.add_argument("--output", default="PlantVillage/shards")
+    parser.add_argument("--size", type=int, default=BASE_SIZE, help="Base resolution images are stored at")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Images per shard file")
+    parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: all cores)")
+    args = parser.parse_args()
+
+    pack(args.data_dir, args.output, args.size, args.shard_size, args.workers)
@@ -0,0 +1,94 @@
+"""
+Croply AI — Startup Budget Check
+Imports `main` in fresh interpreters and fails (exit status 1) when the
+import takes longer than the budget or drags in the vision stack, which
+must stay lazy so /chat and /care-tips start fast and run without torch.
+
+    python startup_check.py                       # median of 5 cold imports vs. 1500 ms
+    python startup_check.py --budget-ms 800 --runs 9
+    python startup_check.py --profile             # slowest imports (python -X importtime)
+
+Uses only the standard library, so it runs in an LLM-only image too.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+IMPORT_BUDGET_MS = float(os.getenv("CROPLY_IMPORT_BUDGET_MS", "1500"))
+
+# Must not be imported by `import main`; the warmup loads them in the background
+HEAVY_MODULES = ("torch", "torchvision", "cv2", "PIL", "numpy", "onnxruntime")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({{'ms': elapsed * 1000, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))\n"
+)
+
+
+def measure_import(module="main", runs=5):
+    """Cold-import `module` `runs` times; returns (per-run ms, heavy modules it loaded)."""
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    timings, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True,
+                             text=True, check=True).stdout
+        # The module may print on import; the probe's JSON is the last line
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        heavy.update(result["heavy"])
+    return timings, sorted(heavy)
+
+
+def profile_import(module="main", top=15):
+    """The `top` slowest imports (cumulative µs) from `python -X importtime`."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that importing the API stays fast and torch-free")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", action="store_true", help="Also list the slowest imports")
+    args = parser.parse_args()
+
+    try:
+        timings, heavy = measure_import(args.module, args.runs)
+    except subprocess.CalledProcessError as e:
+        print(f"import {args.module} failed:\n{e.stderr}")
+        sys.exit(1)
+
+    median = statistics.median(timings)
+    print(f"import {args.module}: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(timings):.0f}, max {max(timings):.0f}), budget {args.budget_ms:.0f} ms")
+    if args.profile:
+        for cumulative, name in profile_import(args.module):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"FAIL: import time is over budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+    if heavy:
+        print(f"FAIL: import {args.module} loaded {', '.join(heavy)}; keep them behind the lazy vision imports")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
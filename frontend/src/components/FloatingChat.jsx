@@ -48,17 +48,13 @@ export default function FloatingChat() {
     if (!msg || loading) return;
 
     const userMsg = { role: 'user', content: msg, time: Date.now() };
-    const updatedMessages = [...messages, userMsg];
-    setMessages(updatedMessages);
+    setMessages((prev) => [...prev, userMsg]);
     setInput('');
     setLoading(true);
 
     try {
-      // Build history for context (exclude errors, strip time)
-      const chatHistory = updatedMessages
-        .filter((m) => !m.error)
-        .map(({ role, content }) => ({ role, content }));
-      const data = await api.chat(msg, langName, chatHistory);
+      const data = await api.chat(msg, langName, localStorage.getItem('croply-float-chat-id'), messages);
+      if (data.conversation_id) localStorage.setItem('croply-float-chat-id', data.conversation_id);
       const aiMsg = {
         role: 'assistant',
         content: data.response || data.raw_content || JSON.stringify(data),
@@ -82,8 +78,11 @@ export default function FloatingChat() {
   };
 
   const clearChat = () => {
+    const conversationId = localStorage.getItem('croply-float-chat-id');
+    if (conversationId) api.deleteConversation(conversationId).catch(() => {});
     setMessages([]);
     localStorage.removeItem('croply-float-chat');
+    localStorage.removeItem('croply-float-chat-id');
   };
 
   return (
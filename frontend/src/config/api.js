@@ -19,14 +19,72 @@ export const api = {
     return response.json();
   },
 
-  // Chat with AI about plant diseases
-  async chat(message, language = 'English', history = null) {
-    const response = await fetch(`${API_BASE_URL}/chat`, {
+  // Predict with enrichment 'stream': resolves as soon as the image is
+  // classified. `info` is a promise for disease info that is still being
+  // generated, or null when it is already in `data`.
+  async predictStreaming(file, language = 'English') {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('language', language);
+    formData.append('enrichment', 'stream');
+
+    const response = await fetch(`${API_BASE_URL}/predict`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok) {
+      throw new Error(`Prediction failed: ${response.statusText}`);
+    }
+
+    // Plain JSON when nothing had to be deferred
+    if (!(response.headers.get('content-type') || '').includes('ndjson')) {
+      return { data: await response.json(), info: null };
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    const nextLine = async () => {
+      while (!buffer.includes('\n')) {
+        const { value, done } = await reader.read();
+        if (done) {
+          const rest = buffer;
+          buffer = '';
+          return rest || null;
+        }
+        buffer += value;
+      }
+      const end = buffer.indexOf('\n');
+      const line = buffer.slice(0, end);
+      buffer = buffer.slice(end + 1);
+      return line;
+    };
+
+    const data = JSON.parse(await nextLine());
+    const info = nextLine().then((line) => (line ? JSON.parse(line).disease_information : null));
+    return { data, info };
+  },
+
+  // Chat with AI about plant diseases. History lives on the server under
+  // conversationId; the response carries the id to send next time. If the
+  // server no longer knows the conversation (restart, another worker), it is
+  // resent once with `history`, the earlier turns shown in the UI.
+  async chat(message, language = 'English', conversationId = null, history = []) {
+    const send = (extra = {}) => fetch(`${API_BASE_URL}/chat`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message, language, history }),
+      body: JSON.stringify({ message, language, conversation_id: conversationId, ...extra }),
     });
 
+    let response = await send();
+    if (response.status === 409 && conversationId) {
+      const turns = history
+        .filter((m) => !m.error)
+        .map(({ role, content }) => ({ role, content }));
+      // An empty history can't seed anything, so start a fresh conversation
+      response = await (turns.length ? send({ history: turns }) : send({ conversation_id: null }));
+    }
+
     if (!response.ok) {
       throw new Error(`Chat failed: ${response.statusText}`);
     }
@@ -34,6 +92,11 @@ export const api = {
     return response.json();
   },
 
+  // Forget a server-side conversation
+  async deleteConversation(conversationId) {
+    await fetch(`${API_BASE_URL}/chat/${encodeURIComponent(conversationId)}`, { method: 'DELETE' });
+  },
+
   // Get plant care tips
   async getCareTips(plantName, language = 'English') {
     const response = await fetch(`${API_BASE_URL}/care-tips`, {
@@ -50,4 +113,7 @@ export const api = {
   },
 };
 
+// Disease info still streaming in, keyed by history item id (DetectPage → ResultsPage)
+export const pendingDiseaseInfo = new Map();
+
 export default api;
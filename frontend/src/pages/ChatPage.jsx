@@ -36,17 +36,13 @@ export default function ChatPage() {
     if (!msg) return;
 
     const userMsg = { role: 'user', content: msg, time: Date.now() };
-    const updatedMessages = [...messages, userMsg];
-    setMessages(updatedMessages);
+    setMessages((prev) => [...prev, userMsg]);
     setInput('');
     setLoading(true);
 
     try {
-      // Build history for context (exclude error messages, strip time field)
-      const chatHistory = updatedMessages
-        .filter((m) => !m.error)
-        .map(({ role, content }) => ({ role, content }));
-      const data = await api.chat(msg, langName, chatHistory);
+      const data = await api.chat(msg, langName, localStorage.getItem('croply-chat-id'), messages);
+      if (data.conversation_id) localStorage.setItem('croply-chat-id', data.conversation_id);
       const aiMsg = {
         role: 'assistant',
         content: data.response || data.raw_content || JSON.stringify(data),
@@ -68,8 +64,11 @@ export default function ChatPage() {
   };
 
   const clearChat = () => {
+    const conversationId = localStorage.getItem('croply-chat-id');
+    if (conversationId) api.deleteConversation(conversationId).catch(() => {});
     setMessages([]);
     localStorage.removeItem('croply-chat');
+    localStorage.removeItem('croply-chat-id');
     toast.success('Chat cleared');
   };
 
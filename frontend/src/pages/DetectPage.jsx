@@ -3,7 +3,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { FiUpload, FiX, FiSearch, FiImage, FiCamera } from 'react-icons/fi';
 import { useNavigate } from 'react-router-dom';
 import { useLanguage } from '../context/LanguageContext';
-import api from '../config/api';
+import api, { pendingDiseaseInfo } from '../config/api';
 import LoadingSpinner from '../components/LoadingSpinner';
 import toast from 'react-hot-toast';
 
@@ -97,7 +97,7 @@ export default function DetectPage() {
 
     setLoading(true);
     try {
-      const data = await api.predict(file, langName);
+      const { data, info } = await api.predictStreaming(file, langName);
 
       // If image is not a valid / clear leaf photo
       if (data.is_valid_leaf === false) {
@@ -122,6 +122,9 @@ export default function DetectPage() {
         language: langName,
       };
 
+      // Disease info still being generated is picked up by ResultsPage
+      if (info) pendingDiseaseInfo.set(historyItem.id, info);
+
       const history = JSON.parse(localStorage.getItem('croply-history') || '[]');
       history.unshift(historyItem);
       localStorage.setItem('croply-history', JSON.stringify(history.slice(0, 50)));
@@ -4,7 +4,7 @@ import { motion } from 'framer-motion';
 import { FiDownload, FiArrowLeft, FiThumbsUp, FiThumbsDown, FiAlertTriangle, FiCheckCircle, FiAlertCircle, FiBookOpen } from 'react-icons/fi';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Cell } from 'recharts';
 import { useLanguage } from '../context/LanguageContext';
-import api from '../config/api';
+import api, { pendingDiseaseInfo } from '../config/api';
 import toast from 'react-hot-toast';
 import jsPDF from 'jspdf';
 
@@ -31,16 +31,49 @@ export default function ResultsPage() {
   const [rating, setRating] = useState(null);
 
   const result = location.state?.result;
+  const [diseaseInfo, setDiseaseInfo] = useState(result?.diseaseInfo ?? null);
+  const [infoLoading, setInfoLoading] = useState(!!result && pendingDiseaseInfo.has(result.id));
 
   useEffect(() => {
     if (!result) navigate('/detect');
   }, [result, navigate]);
 
+  // Disease info that was still being generated when the prediction came back
+  useEffect(() => {
+    const pending = result && pendingDiseaseInfo.get(result.id);
+    if (!pending) return;
+    let cancelled = false;
+
+    pending
+      .then((value) => {
+        pendingDiseaseInfo.delete(result.id);
+        // Keep the history entry complete for later visits
+        const history = JSON.parse(localStorage.getItem('croply-history') || '[]');
+        const idx = history.findIndex((h) => h.id === result.id);
+        if (idx >= 0) {
+          history[idx].diseaseInfo = value;
+          localStorage.setItem('croply-history', JSON.stringify(history));
+        }
+        if (!cancelled) setDiseaseInfo(value);
+      })
+      .catch(() => {
+        pendingDiseaseInfo.delete(result.id);
+        if (!cancelled) toast.error('Failed to load disease information');
+      })
+      .finally(() => {
+        if (!cancelled) setInfoLoading(false);
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [result]);
+
   if (!result) return null;
 
   const severity = getSeverity(result.confidence);
   const SeverityIcon = severity.icon;
-  const info = parseInfo(result.diseaseInfo);
+  const info = parseInfo(diseaseInfo);
   const diseaseName = (result.disease || '').replaceAll('___', ' — ').replaceAll('_', ' ');
 
   // Build mock confidence chart data (top 3)
@@ -271,6 +304,7 @@ export default function ResultsPage() {
           >
             <p className="text-sm text-gray-400 mb-1">{t('diseaseInfo')}</p>
             <h2 className="text-xl font-bold text-white">{diseaseName}</h2>
+            {infoLoading && <p className="text-xs text-gray-500 mt-2 animate-pulse">{t('loading')}</p>}
           </motion.div>
 
           {/* Disease Info Sections */}